@@ -0,0 +1,137 @@
+from datetime import date
+
+from sqlalchemy import Integer, and_, case, cast, func, select, true
+
+from .models import Prediction, PredictionProbability
+
+# weeks are grouped by day in SQL and folded into ISO weeks in Python:
+# SQLite's strftime has no portable ISO week, so both dialects share one labelling
+_SQLITE_BUCKET_FORMATS = {
+    'hour': '%Y-%m-%dT%H:00',
+    'day': '%Y-%m-%d',
+    'month': '%Y-%m',
+}
+_POSTGRES_BUCKET_FORMATS = {
+    'hour': 'YYYY-MM-DD"T"HH24:00',
+    'day': 'YYYY-MM-DD',
+    'month': 'YYYY-MM',
+}
+
+
+def _time_bucket(column, bucket, dialect):
+    if dialect == 'sqlite':
+        return func.strftime(_SQLITE_BUCKET_FORMATS[bucket], column)
+    return func.to_char(func.date_trunc(bucket, column), _POSTGRES_BUCKET_FORMATS[bucket])
+
+
+def _iso_week(day):
+    year, week, _ = date.fromisoformat(day).isocalendar()
+    return f"{year}-W{week:02d}"
+
+
+def _confidence_bin(column, bins, dialect):
+    # casting to integer truncates on SQLite but rounds on PostgreSQL, so floor
+    # first there (SQLite's floor() needs the optional math functions).
+    # 1.0 falls into the last bin rather than a bin of its own
+    scaled = column * bins
+    raw = cast(scaled if dialect == 'sqlite' else func.floor(scaled), Integer)
+    return case((raw >= bins, bins - 1), else_=raw)
+
+
+def compute(db, since=None, until=None, label=None, model_version=None, bucket='day',
+            bins=10, low_confidence=0.6):
+    """Label distribution, per-class confidence, confidence histograms and a
+    per-bucket time series over the predictions in [since, until).
+
+    Every figure is a GROUP BY in the database; no probabilities are loaded
+    into Python.
+    """
+    dialect = db.get_bind().dialect.name
+    filters = []
+    if since is not None:
+        filters.append(Prediction.created_at >= since)
+    if until is not None:
+        filters.append(Prediction.created_at < until)
+    if label is not None:
+        filters.append(Prediction.predicted_label == label)
+    if model_version is not None:
+        filters.append(Prediction.model_version == model_version)
+    where = and_(*filters) if filters else true()
+
+    totals = db.execute(
+        select(func.count(), func.avg(Prediction.max_confidence),
+               func.sum(case((Prediction.max_confidence < low_confidence, 1), else_=0)))
+        .where(where)
+    ).one()
+
+    labels = db.execute(
+        select(Prediction.predicted_label, func.count(), func.avg(Prediction.max_confidence))
+        .where(where)
+        .group_by(Prediction.predicted_label)
+        .order_by(func.count().desc())
+    ).all()
+
+    # mean probability the model gave each class, over all predictions in range
+    class_probabilities = db.execute(
+        select(PredictionProbability.label, func.avg(PredictionProbability.probability))
+        .join(Prediction, Prediction.id == PredictionProbability.prediction_id)
+        .where(where)
+        .group_by(PredictionProbability.label)
+    ).all()
+
+    confidence_bin = _confidence_bin(Prediction.max_confidence, bins, dialect).label('bin')
+    histogram = db.execute(
+        select(Prediction.predicted_label, confidence_bin, func.count())
+        .where(where, Prediction.max_confidence.is_not(None))
+        .group_by(Prediction.predicted_label, confidence_bin)
+    ).all()
+
+    time_bucket = _time_bucket(Prediction.created_at, 'day' if bucket == 'week' else bucket, dialect).label('bucket')
+    series = db.execute(
+        select(time_bucket, Prediction.predicted_label, func.count(),
+               func.sum(Prediction.max_confidence), func.count(Prediction.max_confidence))
+        .where(where)
+        .group_by(time_bucket, Prediction.predicted_label)
+        .order_by(time_bucket)
+    ).all()
+    # (bucket, label) -> [count, confidence sum, confidence count]; merges days into weeks
+    over_time = {}
+    for t, l, n, conf_sum, conf_n in series:
+        key = (_iso_week(t) if bucket == 'week' else t, l)
+        acc = over_time.setdefault(key, [0, 0.0, 0])
+        acc[0] += n
+        acc[1] += conf_sum or 0.0
+        acc[2] += conf_n
+
+    edges = [i / bins for i in range(bins + 1)]
+    histograms = {}
+    for predicted_label, b, n in histogram:
+        histograms.setdefault(predicted_label, [0] * bins)[int(b)] = n
+    overall = [sum(h[i] for h in histograms.values()) for i in range(bins)]
+
+    return {
+        "range": {
+            "since": since.isoformat() if since else None,
+            "until": until.isoformat() if until else None,
+            "label": label,
+            "model_version": model_version,
+        },
+        "total": totals[0],
+        "mean_confidence": totals[1],
+        "low_confidence_threshold": low_confidence,
+        "low_confidence_count": totals[2] or 0,
+        "label_distribution": [
+            {"label": l, "count": n, "mean_confidence": c} for l, n, c in labels
+        ],
+        "mean_class_probability": {l: p for l, p in class_probabilities},
+        "confidence_histogram": {
+            "bin_edges": edges,
+            "all": overall,
+            "by_label": histograms,
+        },
+        "bucket": bucket,
+        "over_time": [
+            {"bucket": t, "label": l, "count": n, "mean_confidence": conf_sum / conf_n if conf_n else None}
+            for (t, l), (n, conf_sum, conf_n) in over_time.items()
+        ],
+    }
@@ -0,0 +1,182 @@
+import collections
+import queue
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+
+import numpy as np
+
+from . import telemetry
+
+
+class _PendingRequest:
+    __slots__ = ('x', 'future', 'enqueued_at')
+
+    def __init__(self, x):
+        self.x = x
+        self.future = Future()
+        self.enqueued_at = time.perf_counter()
+
+
+class MicroBatcher:
+    """Collects single-image requests into batches and runs them in one forward pass.
+
+    A batch is dispatched as soon as it holds `max_batch_size` requests or the
+    oldest request has waited `max_wait_ms`, whichever comes first. With
+    `concurrency` > 1 up to that many batches run at once (e.g. one per
+    inference worker process); while all are busy, new requests keep queueing
+    and form larger batches.
+    """
+
+    def __init__(self, run_batch, max_batch_size=16, max_wait_ms=5.0, concurrency=1, stats_window=1024):
+        self._run_batch = run_batch
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000.0
+        self.concurrency = max(1, int(concurrency))
+        self._running = threading.Semaphore(self.concurrency)
+        self._executor = None
+        if self.concurrency > 1:
+            self._executor = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix='micro-batch')
+        self._stats_lock = threading.Lock()
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+        self._stopping = False
+        # stats
+        self._batches_total = 0
+        self._requests_total = 0
+        self._errors_total = 0
+        self._batch_sizes = collections.Counter()
+        self._wait_ms = collections.deque(maxlen=stats_window)
+        self._run_ms = collections.deque(maxlen=stats_window)
+
+    def start(self):
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stopping = False
+            self._thread = threading.Thread(target=self._loop, name='micro-batcher', daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout=5.0):
+        with self._lock:
+            thread = self._thread
+            self._stopping = True
+            self._thread = None
+        if thread is not None:
+            thread.join(timeout)
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+
+    def submit(self, x):
+        """Queues one preprocessed image of shape (1, H, W, C) or (H, W, C).
+
+        Returns a concurrent.futures.Future resolving to that image's row of
+        model outputs.
+        """
+        if self._thread is None:
+            self.start()
+        if x.ndim == 3:
+            x = x[np.newaxis]
+        request = _PendingRequest(x)
+        self._queue.put(request)
+        return request.future
+
+    def queue_depth(self):
+        return self._queue.qsize()
+
+    def stats(self):
+        with self._stats_lock:
+            waits = sorted(self._wait_ms)
+            runs = sorted(self._run_ms)
+        return {
+            "queue_depth": self.queue_depth(),
+            "max_batch_size": self.max_batch_size,
+            "concurrency": self.concurrency,
+            "max_wait_ms": self.max_wait * 1000.0,
+            "batches_total": self._batches_total,
+            "requests_total": self._requests_total,
+            "errors_total": self._errors_total,
+            "batch_size_histogram": {str(k): v for k, v in sorted(self._batch_sizes.items())},
+            "wait_ms": _summarize(waits),
+            "run_ms": _summarize(runs),
+        }
+
+    def _collect(self):
+        try:
+            first = self._queue.get(timeout=0.1)
+        except queue.Empty:
+            return []
+        batch = [first]
+        deadline = first.enqueued_at + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            try:
+                if remaining <= 0:
+                    batch.append(self._queue.get_nowait())
+                else:
+                    batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _loop(self):
+        while not self._stopping:
+            # only start collecting once a batch can actually run
+            if not self._running.acquire(timeout=0.1):
+                continue
+            batch = self._collect()
+            if not batch:
+                self._running.release()
+            elif self._executor is not None:
+                self._executor.submit(self._dispatch, batch)
+            else:
+                self._dispatch(batch)
+        # fail whatever is still queued so no handler waits forever
+        while True:
+            try:
+                request = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            request.future.set_exception(RuntimeError('Batcher stopped'))
+
+    def _dispatch(self, batch):
+        started = time.perf_counter()
+        failed = False
+        try:
+            x = batch[0].x if len(batch) == 1 else np.concatenate([r.x for r in batch], axis=0)
+            outputs = self._run_batch(x)
+        except Exception as e:
+            failed = True
+            for request in batch:
+                request.future.set_exception(e)
+        else:
+            offset = 0
+            for request in batch:
+                n = request.x.shape[0]
+                request.future.set_result(outputs[offset] if n == 1 else outputs[offset:offset + n])
+                offset += n
+        finally:
+            self._running.release()
+        for request in batch:
+            telemetry.observe_stage('batch_wait', started - request.enqueued_at)
+        with self._stats_lock:
+            for request in batch:
+                self._wait_ms.append((started - request.enqueued_at) * 1000.0)
+            self._run_ms.append((time.perf_counter() - started) * 1000.0)
+            self._batches_total += 1
+            self._requests_total += len(batch)
+            self._errors_total += failed
+            self._batch_sizes[len(batch)] += 1
+
+
+def _summarize(values):
+    if not values:
+        return {"count": 0, "mean": None, "p50": None, "p99": None, "max": None}
+    return {
+        "count": len(values),
+        "mean": sum(values) / len(values),
+        "p50": values[int(0.50 * (len(values) - 1))],
+        "p99": values[int(0.99 * (len(values) - 1))],
+        "max": values[-1],
+    }
@@ -0,0 +1,166 @@
+import io
+import os
+import shutil
+import time
+
+from PIL import Image, features
+
+from . import preprocess
+
+ORIGINAL = 'original'
+INPUT_NAME = 'input.png'
+TMP_SUFFIX = '.tmp'
+
+
+def _atomic_write(path, data):
+    tmp = f"{path}.{os.urandom(4).hex()}{TMP_SUFFIX}"
+    with open(tmp, 'wb') as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+
+class BlobStore:
+    """Content-addressed store for uploaded scans.
+
+    Each upload lives in root/<h[:2]>/<h[2:4]>/<sha256>/ and is written once,
+    however often it is uploaded: the original bytes, a small preview
+    thumbnail for history views and, on request, the 224x224 grayscale model
+    input. Every file is written to a temp name and renamed into place, so
+    readers never see a partial file. `compact()` applies the retention policy.
+    """
+
+    def __init__(self, root, preview_format='webp', preview_size=256):
+        self.root = root
+        if preview_format == 'webp' and not features.check('webp'):
+            preview_format = 'jpeg'
+        self.preview_format = preview_format
+        self.preview_name = 'preview.webp' if preview_format == 'webp' else 'preview.jpg'
+        self.preview_size = int(preview_size)
+        os.makedirs(root, exist_ok=True)
+
+    def blob_dir(self, content_hash):
+        return os.path.join(self.root, content_hash[:2], content_hash[2:4], content_hash)
+
+    def original_path(self, content_hash):
+        d = self.blob_dir(content_hash)
+        try:
+            names = os.listdir(d)
+        except FileNotFoundError:
+            return None
+        for name in names:
+            if name.startswith(ORIGINAL) and not name.endswith(TMP_SUFFIX):
+                return os.path.join(d, name)
+        return None
+
+    def preview_path(self, content_hash):
+        return os.path.join(self.blob_dir(content_hash), self.preview_name)
+
+    def input_path(self, content_hash):
+        return os.path.join(self.blob_dir(content_hash), INPUT_NAME)
+
+    def ingest(self, content_hash, contents, filename=None):
+        """Stores an upload unless already present; returns the original's path.
+
+        Only the original is written here; the preview and model input are
+        derived later (`ensure_preview` / `ensure_input`), off the request path.
+        """
+        d = self.blob_dir(content_hash)
+        os.makedirs(d, exist_ok=True)
+        original = self.original_path(content_hash)
+        if original is None:
+            ext = os.path.splitext(filename or '')[1].lower() or '.png'
+            original = os.path.join(d, ORIGINAL + ext)
+            _atomic_write(original, contents)
+        else:
+            # deduplicated: refresh both mtimes, so the orphan grace period and
+            # original retention count from this latest upload
+            os.utime(original)
+            os.utime(d)
+        return original
+
+    def _write_preview(self, content_hash, contents):
+        img = Image.open(io.BytesIO(contents))
+        if img.format == 'JPEG':
+            img.draft('L', (self.preview_size, self.preview_size))
+        if img.mode != 'L':
+            img = img.convert('L')
+        img.thumbnail((self.preview_size, self.preview_size), Image.BICUBIC)
+        buf = io.BytesIO()
+        img.save(buf, format=self.preview_format.upper(), quality=80)
+        _atomic_write(self.preview_path(content_hash), buf.getvalue())
+
+    def _write_input(self, content_hash, contents):
+        buf = io.BytesIO()
+        preprocess.decode_image(contents).save(buf, format='PNG', optimize=False)
+        _atomic_write(self.input_path(content_hash), buf.getvalue())
+
+    def _ensure(self, path, write, content_hash, source_path):
+        if os.path.exists(path):
+            return path
+        source = self.original_path(content_hash) or source_path
+        if source is None or not os.path.exists(source):
+            return None
+        with open(source, 'rb') as f:
+            contents = f.read()
+        os.makedirs(self.blob_dir(content_hash), exist_ok=True)
+        try:
+            write(content_hash, contents)
+        except Exception:
+            return None
+        return path
+
+    def ensure_preview(self, content_hash, source_path=None):
+        """Preview path, generated from the original (or `source_path`) if it is missing; None if impossible"""
+        return self._ensure(self.preview_path(content_hash), self._write_preview, content_hash, source_path)
+
+    def ensure_input(self, content_hash, source_path=None):
+        """224x224 model input path, generated like `ensure_preview`"""
+        return self._ensure(self.input_path(content_hash), self._write_input, content_hash, source_path)
+
+    def compact(self, referenced_hashes, original_retention_days=0.0, grace_seconds=3600.0):
+        """Applies the retention policy; returns counts of what was removed.
+
+        - blobs whose hash is not in `referenced_hashes` are removed once
+          older than `grace_seconds` (an upload is written before its
+          prediction row is committed)
+        - with `original_retention_days` > 0, originals not uploaded again
+          within that time are deleted while their preview and model input
+          are kept
+        - leftover temp files older than `grace_seconds` are deleted
+        """
+        now = time.time()
+        removed = {"orphans": 0, "originals": 0, "temp_files": 0, "bytes": 0}
+        retention_s = original_retention_days * 86400.0
+        for dirpath, dirnames, filenames in os.walk(self.root):
+            depth = os.path.relpath(dirpath, self.root).count(os.sep) + (dirpath != self.root)
+            for name in filenames:
+                path = os.path.join(dirpath, name)
+                try:
+                    st = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                if name.endswith(TMP_SUFFIX) and now - st.st_mtime > grace_seconds:
+                    os.remove(path)
+                    removed["temp_files"] += 1
+                    removed["bytes"] += st.st_size
+                elif (depth == 3 and retention_s > 0 and name.startswith(ORIGINAL)
+                        and now - st.st_mtime > retention_s):
+                    # derivatives are made lazily; make sure they outlive the original
+                    content_hash = os.path.basename(dirpath)
+                    self.ensure_preview(content_hash)
+                    self.ensure_input(content_hash)
+                    os.remove(path)
+                    removed["originals"] += 1
+                    removed["bytes"] += st.st_size
+            if depth == 2:
+                # dirpath is root/ab/cd; its children are blob directories
+                for name in list(dirnames):
+                    blob = os.path.join(dirpath, name)
+                    if name in referenced_hashes or now - os.stat(blob).st_mtime <= grace_seconds:
+                        continue
+                    removed["bytes"] += sum(
+                        os.path.getsize(os.path.join(blob, f)) for f in os.listdir(blob))
+                    shutil.rmtree(blob, ignore_errors=True)
+                    dirnames.remove(name)
+                    removed["orphans"] += 1
+        return removed
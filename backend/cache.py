@@ -0,0 +1,73 @@
+import collections
+import threading
+import time
+
+
+class PredictionCache:
+    """Thread-safe in-process LRU with a per-entry TTL.
+
+    Keys are (content_hash, model_version) so a new model never serves stale
+    results. An optional `backing_lookup(key)` is consulted on a memory miss
+    (e.g. the predictions table) and its result promoted into the LRU.
+    """
+
+    def __init__(self, max_size=1024, ttl_seconds=3600.0, backing_lookup=None):
+        self.max_size = max(0, int(max_size))
+        self.ttl = float(ttl_seconds)
+        self.backing_lookup = backing_lookup
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.backing_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                value, expires_at = entry
+                if expires_at > now:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._entries[key]
+                self.evictions += 1
+        if self.backing_lookup is not None:
+            value = self.backing_lookup(key)
+            if value is not None:
+                self.put(key, value)
+                with self._lock:
+                    self.backing_hits += 1
+                return value
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, key, value):
+        if self.max_size == 0:
+            return
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        total = self.hits + self.backing_hits + self.misses
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "ttl_seconds": self.ttl,
+            "hits": self.hits,
+            "backing_hits": self.backing_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": ((self.hits + self.backing_hits) / total) if total else None,
+        }
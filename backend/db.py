@@ -1,14 +1,80 @@
-from sqlalchemy import create_engine
+from sqlalchemy import DateTime, create_engine, event, inspect, text
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 import os
 
+from . import config
+
 BASE_DIR = os.path.dirname(__file__)
 DB_PATH = os.path.join(BASE_DIR, 'predictions.db')
-SQLALCHEMY_DATABASE_URL = f"sqlite:///{DB_PATH}"
+SQLALCHEMY_DATABASE_URL = config.DATABASE_URL or f"sqlite:///{DB_PATH}"
+
+
+def make_engine(url):
+    if not url.startswith('sqlite'):
+        return create_engine(url, pool_pre_ping=True)
+    eng = create_engine(url, connect_args={"check_same_thread": False})
+
+    @event.listens_for(eng, "connect")
+    def _sqlite_pragmas(dbapi_conn, _record):
+        cur = dbapi_conn.cursor()
+        # WAL: readers never block the writer and a commit appends to the log
+        # instead of rewriting pages
+        cur.execute("PRAGMA journal_mode=WAL")
+        cur.execute(f"PRAGMA synchronous={config.SQLITE_SYNCHRONOUS}")
+        cur.execute(f"PRAGMA cache_size=-{config.SQLITE_CACHE_SIZE_MB * 1024}")
+        cur.execute(f"PRAGMA mmap_size={config.SQLITE_MMAP_SIZE_MB * 1024 * 1024}")
+        cur.execute(f"PRAGMA busy_timeout={config.SQLITE_BUSY_TIMEOUT_MS}")
+        cur.execute("PRAGMA temp_store=MEMORY")
+        cur.execute("PRAGMA foreign_keys=ON")
+        cur.close()
+
+    return eng
+
 
-engine = create_engine(
-    SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False}
-)
+engine = make_engine(SQLALCHEMY_DATABASE_URL)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
+
+# PRAGMA user_version once the one-off SQLite data fixes in migrate() have run
+SQLITE_DATA_VERSION = 1
+
+
+def migrate(bind=engine):
+    """Adds columns and indexes declared after a table was first created.
+
+    `create_all` only creates missing tables, so existing databases would
+    otherwise never pick up new columns.
+    """
+    insp = inspect(bind)
+    with bind.begin() as conn:
+        normalize = (bind.dialect.name == 'sqlite'
+                     and conn.execute(text("PRAGMA user_version")).scalar() < SQLITE_DATA_VERSION)
+        for table in Base.metadata.sorted_tables:
+            if not insp.has_table(table.name):
+                continue
+            existing = {c['name'] for c in insp.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing:
+                    continue
+                col_type = column.type.compile(dialect=bind.dialect)
+                conn.execute(text(f'ALTER TABLE {table.name} ADD COLUMN {column.name} {col_type}'))
+            for index in table.indexes:
+                index.create(conn, checkfirst=True)
+            if normalize:
+                _normalize_sqlite_datetimes(conn, table)
+        if normalize:
+            conn.execute(text(f"PRAGMA user_version = {SQLITE_DATA_VERSION}"))
+
+
+def _normalize_sqlite_datetimes(conn, table):
+    # CURRENT_TIMESTAMP writes 'YYYY-MM-DD HH:MM:SS' while SQLAlchemy binds
+    # 'YYYY-MM-DD HH:MM:SS.ffffff'; SQLite compares them as text, so rewrite
+    # the short form to keep range and keyset comparisons exact. Scans every
+    # row, so it runs once per database (see SQLITE_DATA_VERSION); the app
+    # itself always writes the long form
+    for column in table.columns:
+        if isinstance(column.type, DateTime):
+            conn.execute(text(
+                f"UPDATE {table.name} SET {column.name} = {column.name} || '.000000' "
+                f"WHERE length({column.name}) = 19"))
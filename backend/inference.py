@@ -0,0 +1,122 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from . import predict as predictor
+from . import telemetry
+from .preprocess import INPUT_SHAPE, decode_into
+
+
+class InferenceQueueFull(Exception):
+    pass
+
+
+def _prepare(image_bytes):
+    # runs on the executor: decode, and the (possibly lazy) model load in submit()
+    with telemetry.stage('decode'):
+        x = predictor.preprocess_image_bytes(image_bytes)
+    return predictor.submit(x)
+
+
+def _try_decode_into(image_bytes, out):
+    try:
+        with telemetry.stage('decode'):
+            decode_into(image_bytes, out)
+        return None
+    except Exception as e:
+        return f"Could not decode image: {e}"
+
+
+class InferenceService:
+    """Async front door to the predictor.
+
+    Decoding/preprocessing runs on a dedicated bounded thread pool, the
+    forward pass on the micro-batcher, so neither ties up the event loop or
+    the server's shared threadpool. At most `max_pending` requests may be in
+    flight; beyond that `predict_image` raises InferenceQueueFull.
+    """
+
+    def __init__(self, workers, max_pending):
+        self.workers = max(1, int(workers))
+        self.max_pending = max(1, int(max_pending))
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='inference')
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._rejected_total = 0
+
+    def acquire(self):
+        """Takes an in-flight slot or raises InferenceQueueFull; pair with release()"""
+        with self._lock:
+            if self._pending >= self.max_pending:
+                self._rejected_total += 1
+                raise InferenceQueueFull(f"{self._pending} inference requests already in flight")
+            self._pending += 1
+
+    def release(self):
+        with self._lock:
+            self._pending -= 1
+
+    def predict_image(self, image_bytes):
+        """Admits the request (or raises InferenceQueueFull) and returns an awaitable
+        resolving to (predicted_label, probabilities_dict, predicted_index)."""
+        self.acquire()
+        return asyncio.ensure_future(self._predict_image(image_bytes))
+
+    async def _predict_image(self, image_bytes):
+        try:
+            loop = asyncio.get_running_loop()
+            future = await loop.run_in_executor(self._executor, _prepare, image_bytes)
+            preds = await asyncio.wrap_future(future)
+            return predictor.postprocess(preds)
+        finally:
+            self.release()
+
+    async def run_images(self, images, batch_size):
+        """Runs a multi-image job for a caller already holding a slot (see acquire()).
+
+        Resolves to a list with, per image, either (predicted_label,
+        probabilities_dict, predicted_index) or an error string when the
+        image could not be decoded."""
+        loop = asyncio.get_running_loop()
+        results = [None] * len(images)
+
+        def decode_chunk(start):
+            # each chunk is decoded in parallel straight into its own batch buffer
+            stop = min(start + batch_size, len(images))
+            buf = np.empty((stop - start,) + INPUT_SHAPE, dtype=np.float32)
+            decoding = asyncio.gather(*(
+                loop.run_in_executor(self._executor, _try_decode_into, images[i], buf[i - start])
+                for i in range(start, stop)
+            ))
+            return start, buf, decoding
+
+        pending = decode_chunk(0) if images else None
+        while pending is not None:
+            start, buf, decoding = pending
+            errors = await decoding
+            next_start = start + batch_size
+            # decode the next chunk while this one runs through the model
+            pending = decode_chunk(next_start) if next_start < len(images) else None
+            ok = [j for j, error in enumerate(errors) if error is None]
+            for j, error in enumerate(errors):
+                if error is not None:
+                    results[start + j] = error
+            if ok:
+                x = buf if len(ok) == len(buf) else buf[ok]
+                preds = await loop.run_in_executor(self._executor, predictor.predict_batch, x)
+                for j, row in zip(ok, preds):
+                    results[start + j] = predictor.postprocess(row)
+        return results
+
+    def stats(self):
+        return {
+            "workers": self.workers,
+            "in_flight": self._pending,
+            "max_pending": self.max_pending,
+            "rejected_total": self._rejected_total,
+        }
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False)
@@ -1,27 +1,81 @@
 import os
 import io
-import json
+import asyncio
 import base64
-from fastapi import FastAPI, UploadFile, File, HTTPException, Depends
+import hashlib
+import json
+import tempfile
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import List, Optional
+from fastapi import FastAPI, UploadFile, File, HTTPException, Depends, Request, Query
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse, Response, FileResponse
+from fastapi.concurrency import run_in_threadpool
+from starlette.background import BackgroundTask
+from sqlalchemy import and_, or_
 from sqlalchemy.orm import Session
-from .db import SessionLocal, engine, Base
-from .models import Prediction
+from .db import SessionLocal, engine, Base, migrate
+from .models import (Prediction, PredictionProbability, backfill_probabilities, isoformat_utc,
+                     probability_rows, utcnow)
 from . import predict as predictor
-import shutil
-
+from . import config
+from .inference import InferenceService, InferenceQueueFull
+from .cache import PredictionCache
+from .metrics_cache import ArtifactPayloadCache, etag_matches, file_digest
+from .writer import GroupCommitWriter
+from .blobstore import BlobStore
+from . import analytics
+from . import telemetry
+from .profiling import ProfileStore, ProfilingMiddleware
+from .studies import iter_upload_images, limit_images, summarize_study, StudyAggregate
 
-# Create DB tables
-Base.metadata.create_all(bind=engine)
 
 app = FastAPI()
 
+inference = InferenceService(config.INFERENCE_WORKERS, config.INFERENCE_QUEUE_MAX)
+db_writer = GroupCommitWriter(engine, config.DB_WRITE_BATCH_ROWS, config.DB_WRITE_BATCH_MS)
+
+
+def _find_stored_prediction(key):
+    content_hash, model_version = key
+    db = SessionLocal()
+    try:
+        r = (db.query(Prediction.predicted_label, Prediction.probabilities_json)
+             .filter(Prediction.content_hash == content_hash, Prediction.model_version == model_version)
+             .order_by(Prediction.created_at.desc())
+             .first())
+    finally:
+        db.close()
+    if r is None:
+        return None
+    probabilities = json.loads(r.probabilities_json)
+    return r.predicted_label, probabilities, list(probabilities).index(r.predicted_label)
+
+
+prediction_cache = PredictionCache(
+    config.PREDICTION_CACHE_SIZE,
+    config.PREDICTION_CACHE_TTL_S,
+    backing_lookup=_find_stored_prediction if config.PREDICTION_CACHE_DB else None,
+)
+
+def _init_db():
+    # at startup rather than import, so importing the app (tests, tooling) touches no database
+    Base.metadata.create_all(bind=engine)
+    migrate(engine)
+    backfilled = backfill_probabilities(engine)
+    if backfilled:
+        print(f"Migrated per-class probabilities of {backfilled} stored predictions")
+
+
 # Check if model exists on startup
 @app.on_event("startup")
 async def startup_event():
-    import os
-    model_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), "artifacts", "brain_model.h5")
+    await run_in_threadpool(_init_db)
+    asyncio.get_running_loop().create_task(_compaction_loop())
+    model_path = predictor.model_path_for(config.INFERENCE_BACKEND)
     if not os.path.exists(model_path):
         print("\n" + "="*80)
         print("⚠️  WARNING: Model file not found!")
@@ -30,6 +84,28 @@ async def startup_event():
         print("  1. Activate virtual environment: source myenv/bin/activate")
         print("  2. Run training: python model.py")
         print("="*80 + "\n")
+    else:
+        # load + warm up off the event loop so /health can report progress
+        asyncio.get_running_loop().run_in_executor(None, _warmup_model)
+
+
+def _warmup_model():
+    try:
+        state = predictor.warmup(config.WARMUP_BATCH_SIZES, config.WARMUP_ITERATIONS)
+        print(f"Model ready: load {state['load_seconds']:.2f}s, "
+              f"warm-up {state['warmup_seconds']:.2f}s "
+              f"(batch sizes {list(config.WARMUP_BATCH_SIZES)} x {config.WARMUP_ITERATIONS})")
+    except Exception as e:
+        import traceback
+        print("ERROR during model warm-up:", str(e))
+        print(traceback.format_exc())
+
+@app.on_event("shutdown")
+def shutdown_event():
+    inference.shutdown()
+    predictor.shutdown()
+    db_writer.stop()
+    _preview_executor.shutdown(wait=False)
 
 # Basic CORS for Next.js frontend
 app.add_middleware(
@@ -39,6 +115,15 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(telemetry.MetricsMiddleware)
+
+PROFILE_DIR = config.PROFILE_DIR or os.path.join(os.path.dirname(__file__), 'profiles')
+profile_store = ProfileStore(PROFILE_DIR, config.PROFILE_KEEP)
+if config.PROFILE_REQUESTS != 'off':
+    # not installed at all when off, so unprofiled serving pays nothing
+    app.add_middleware(ProfilingMiddleware, store=profile_store, mode=config.PROFILE_REQUESTS,
+                       interval_ms=config.PROFILE_INTERVAL_MS,
+                       tf_trace=config.PROFILE_TF_TRACE and config.INFERENCE_BACKEND in predictor.KERAS_BACKENDS)
 
 
 def get_db():
@@ -49,67 +134,278 @@ def get_db():
         db.close()
 
 
-UPLOAD_DIR = os.path.join(os.path.dirname(__file__), 'uploads')
-os.makedirs(UPLOAD_DIR, exist_ok=True)
+UPLOAD_DIR = config.UPLOAD_DIR or os.path.join(os.path.dirname(__file__), 'uploads')
+blob_store = BlobStore(UPLOAD_DIR, config.BLOB_PREVIEW_FORMAT, config.BLOB_PREVIEW_SIZE)
 
 
 @app.get('/health')
 def health():
-    return {"status": "ok"}
+    state = predictor.readiness()
+    return {"status": "ok" if state["ready"] else "starting", **state}
+
+
+@app.get('/stats')
+def stats():
+    # operational counters for tuning the serving path
+    return {
+        "inference": inference.stats(),
+        "prediction_cache": prediction_cache.stats(),
+        "batching": predictor.batching_stats(),
+        "worker_pool": predictor.worker_pool_stats(),
+        "db_writer": db_writer.stats(),
+    }
+
+
+def _service_metrics():
+    """Scrape-time gauges for state kept by the serving components themselves"""
+    state = predictor.readiness()
+    cache = prediction_cache.stats()
+    inf = inference.stats()
+    writer = db_writer.stats()
+    families = [
+        ('brain_model_ready', 'gauge', 'Whether the model is loaded and warmed up',
+         [({}, 1 if state['ready'] else 0)]),
+        ('brain_model_load_seconds', 'gauge', 'Time taken to load the model',
+         [({}, state['load_seconds'])]),
+        ('brain_model_warmup_seconds', 'gauge', 'Time taken by the startup warm-up passes',
+         [({}, state['warmup_seconds'])]),
+        ('brain_inference_in_flight', 'gauge', 'Admitted inference requests', [({}, inf['in_flight'])]),
+        ('brain_inference_rejected_total', 'counter', 'Requests rejected with 503 by admission control',
+         [({}, inf['rejected_total'])]),
+        ('brain_prediction_cache_lookups_total', 'counter', 'Prediction cache lookups by result', [
+            ({'result': 'hit'}, cache['hits']),
+            ({'result': 'db_hit'}, cache['backing_hits']),
+            ({'result': 'miss'}, cache['misses']),
+        ]),
+        ('brain_prediction_cache_hit_ratio', 'gauge', 'Share of lookups served from memory or the DB',
+         [({}, cache['hit_rate'])]),
+        ('brain_prediction_cache_entries', 'gauge', 'Entries in the in-memory prediction cache',
+         [({}, cache['size'])]),
+        ('brain_db_writer_queue_depth', 'gauge', 'Writes waiting for a group commit',
+         [({}, writer['queue_depth'])]),
+        ('brain_db_writer_commits_total', 'counter', 'Group commits', [({}, writer['commits_total'])]),
+        ('brain_db_writer_rows_total', 'counter', 'Rows written by group commits', [({}, writer['rows_total'])]),
+        ('brain_db_writer_errors_total', 'counter', 'Writes that failed', [({}, writer['errors_total'])]),
+    ]
+    batching = predictor.batching_stats()
+    if batching:
+        families.append(('brain_batcher_queue_depth', 'gauge', 'Requests waiting for a micro-batch',
+                         [({}, batching['queue_depth'])]))
+    pool = engine.pool
+    if hasattr(pool, 'checkedout'):
+        families.append(('brain_db_pool_connections', 'gauge', 'SQLAlchemy connection pool', [
+            ({'state': 'checked_out'}, pool.checkedout()),
+            ({'state': 'idle'}, pool.checkedin()),
+            ({'state': 'overflow'}, max(0, pool.overflow())),
+            ({'state': 'size'}, pool.size()),
+        ]))
+    return families
+
+
+telemetry.REGISTRY.add_collector(_service_metrics)
+
+
+@app.get('/metrics/prometheus')
+def metrics_prometheus():
+    # operational metrics in the Prometheus text format; /metrics is model quality
+    return Response(telemetry.REGISTRY.render(), media_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+@app.get('/admin/profiles')
+def admin_profiles(limit: int = Query(50, ge=1, le=500)):
+    return {"mode": config.PROFILE_REQUESTS, "profiles": profile_store.list(limit)}
+
+
+@app.get('/admin/profiles/{profile_id}')
+def admin_profile(profile_id: str):
+    summary = profile_store.load(profile_id)
+    if summary is None:
+        raise HTTPException(status_code=404, detail='Not found')
+    return summary
+
+
+@app.get('/admin/profiles/{profile_id}/stacks')
+def admin_profile_stacks(profile_id: str):
+    # collapsed stacks: feed to flamegraph.pl or drop into speedscope.app
+    path = profile_store.path(profile_id)
+    if path is None or not os.path.exists(os.path.join(path, 'stacks.txt')):
+        raise HTTPException(status_code=404, detail='Not found')
+    return FileResponse(os.path.join(path, 'stacks.txt'), media_type='text/plain; charset=utf-8')
+
+
+metrics_cache = ArtifactPayloadCache(predictor.METRICS_ARTIFACT_PATHS, predictor.get_saved_metrics)
+plots_cache = ArtifactPayloadCache(predictor.PLOTS_ARTIFACT_PATHS, predictor.get_saved_plots)
+
+
+def _cached_json_response(request: Request, payload):
+    gzipped = 'gzip' in request.headers.get('accept-encoding', '')
+    etag = payload.gzip_etag if gzipped else payload.etag
+    headers = {"ETag": etag, "Cache-Control": "no-cache", "Vary": "Accept-Encoding"}
+    if etag_matches(request.headers.get('if-none-match'), etag):
+        return Response(status_code=304, headers=headers)
+    if gzipped:
+        headers["Content-Encoding"] = "gzip"
+        return Response(payload.gzip_body, media_type='application/json', headers=headers)
+    return Response(payload.body, media_type='application/json', headers=headers)
 
 
 @app.get('/metrics')
-def metrics():
-    m = predictor.get_saved_metrics()
-    return m
+def metrics(request: Request):
+    return _cached_json_response(request, metrics_cache.get())
 
 
 @app.get('/metrics/plots')
-def metrics_plots():
-    m = predictor.get_saved_metrics()
-    # return base64 images
-    out = {
-        "confusion_matrix_png_base64": m.get('confusion_matrix_png_base64'),
-        "training_curves_png_base64": m.get('training_curves_png_base64')
-    }
-    return out
+def metrics_plots(request: Request):
+    return _cached_json_response(request, plots_cache.get())
+
+
+IMMUTABLE_CACHE_CONTROL = "max-age=31536000, immutable"
+
+
+def _file_response(request: Request, path, cache_control, etag):
+    headers = {"ETag": etag, "Cache-Control": cache_control}
+    if etag_matches(request.headers.get('if-none-match'), etag):
+        return Response(status_code=304, headers=headers)
+    return FileResponse(path, headers=headers)
+
+
+@app.get('/metrics/images/{name}')
+def metrics_image(name: str, request: Request, v: str = None):
+    path = predictor.VISUALIZATION_IMAGES.get(name)
+    if path is None or not os.path.exists(path):
+        raise HTTPException(status_code=404, detail='Not found')
+    digest = file_digest(path)
+    # only the exact URL /metrics hands out is immutable; a stale or made-up
+    # ?v= must not get pinned in browser caches
+    versioned = v == digest[:16]
+    return _file_response(request, path, f"public, {IMMUTABLE_CACHE_CONTROL}" if versioned else "no-cache",
+                          '"' + digest[:32] + '"')
+
+
+# previews are encoded here, after the response, so a request never waits on them
+_preview_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='blob-preview')
+
+
+def _save_upload(original_filename, contents, content_hash) -> str:
+    # content-addressed: re-uploads of the same scan share one blob
+    with telemetry.stage('disk_write'):
+        path = blob_store.ingest(content_hash, contents, original_filename)
+    if not os.path.exists(blob_store.preview_path(content_hash)):
+        _preview_executor.submit(blob_store.ensure_preview, content_hash)
+    return path
+
+
+def _compact_blobs():
+    db = SessionLocal()
+    try:
+        referenced = {h for (h,) in db.query(Prediction.content_hash).filter(
+            Prediction.content_hash.isnot(None)).distinct()}
+    finally:
+        db.close()
+    removed = blob_store.compact(referenced, config.BLOB_ORIGINAL_RETENTION_DAYS)
+    if any(removed.values()):
+        print(f"Blob compaction: removed {removed['orphans']} orphaned blobs, {removed['originals']} "
+              f"expired originals, {removed['temp_files']} temp files ({removed['bytes'] / 1e6:.1f} MB)")
+
+
+async def _compaction_loop():
+    while True:
+        try:
+            await run_in_threadpool(_compact_blobs)
+        except Exception as e:
+            print("ERROR during blob compaction:", repr(e))
+        if config.BLOB_COMPACT_INTERVAL_H <= 0:
+            return
+        await asyncio.sleep(config.BLOB_COMPACT_INTERVAL_H * 3600.0)
+
+
+def _lookup_cached(contents):
+    with telemetry.stage('cache_lookup'):
+        content_hash = hashlib.sha256(contents).hexdigest()
+        model_version = predictor.model_version()
+        if model_version is None:
+            # model still loading: a miss, the request queues for inference like any other
+            return content_hash, None, None
+        return content_hash, model_version, prediction_cache.get((content_hash, model_version))
+
+
+def _log_write_error(future):
+    if future.exception() is not None:
+        print("ERROR writing predictions:", repr(future.exception()))
 
 
-def _save_upload(file: UploadFile) -> str:
-    ext = os.path.splitext(file.filename)[1] or '.png'
-    filename = f"{os.urandom(8).hex()}{ext}"
-    target = os.path.join(UPLOAD_DIR, filename)
-    with open(target, 'wb') as buffer:
-        shutil.copyfileobj(file.file, buffer)
-    return target
+async def _store_predictions(rows):
+    """Queues prediction rows for the group-commit writer; returns [(id, created_at)] in order.
+
+    Each row holds the Prediction columns plus `probabilities` ({label: p}),
+    stored as JSON, as max_confidence and as prediction_probabilities rows.
+
+    With DB_WRITE_WAIT (default) this returns once the rows are committed.
+    """
+    if not rows:
+        return []
+    values, writes = [], []
+    for row in rows:
+        probabilities = row.pop('probabilities')
+        v = dict(row, id=str(uuid.uuid4()), created_at=utcnow(),
+                 probabilities_json=json.dumps(probabilities),
+                 max_confidence=float(max(probabilities.values())))
+        values.append(v)
+        writes.append((Prediction.__table__, v))
+        writes.extend((PredictionProbability.__table__, c) for c in probability_rows(v['id'], probabilities))
+    future = db_writer.submit(writes)
+    if config.DB_WRITE_WAIT:
+        with telemetry.stage('db_commit_wait'):
+            await asyncio.wrap_future(future)
+    else:
+        future.add_done_callback(_log_write_error)
+    return [(v['id'], v['created_at']) for v in values]
 
 
 @app.post('/predict')
-def predict(file: UploadFile = File(...), db: Session = Depends(get_db)):
+async def predict(file: UploadFile = File(...)):
+    with telemetry.stage('upload_read'):
+        contents = await file.read()
+    try:
+        content_hash, model_version, cached = await run_in_threadpool(_lookup_cached, contents)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    if cached is None:
+        try:
+            # admission control: shed load instead of queueing without bound
+            predicted = inference.predict_image(contents)
+        except InferenceQueueFull:
+            raise HTTPException(status_code=503, detail='Inference queue is full, retry shortly',
+                                headers={"Retry-After": "1"})
     try:
-        contents = file.file.read()
-        # store file
-        file.file.seek(0)
-        saved_path = _save_upload(file)
-        predicted_label, probabilities, predicted_index = predictor.predict_image(contents)
+        # persist the upload while the model runs
+        saving = run_in_threadpool(_save_upload, file.filename, contents, content_hash)
+        if cached is None:
+            result, saved_path = await asyncio.gather(predicted, saving)
+            model_version = model_version or predictor.model_version()
+            prediction_cache.put((content_hash, model_version), result)
+        else:
+            result, saved_path = cached, await saving
+        predicted_label, probabilities, predicted_index = result
         # create DB entry
-        p = Prediction(
+        [(item_id, created_at)] = await _store_predictions([dict(
             filename=file.filename,
             image_path=saved_path,
             predicted_label=predicted_label,
-            probabilities_json=json.dumps(probabilities)
-        )
-        db.add(p)
-        db.commit()
-        db.refresh(p)
+            probabilities=probabilities,
+            content_hash=content_hash,
+            model_version=model_version,
+        )])
         # recommendations
-        recs = _get_recommendations()
+        with telemetry.stage('recommendations'):
+            recs = _get_recommendations()
         return JSONResponse({
-            "id": p.id,
+            "id": item_id,
             "predicted_label": predicted_label,
             "probabilities": probabilities,
-            "created_at": p.created_at.isoformat(),
+            "created_at": isoformat_utc(created_at),
             "recommendations": recs.get(predicted_label, {}),
+            "cached": cached is not None,
         })
     except Exception as e:
         import traceback
@@ -118,18 +414,293 @@ def predict(file: UploadFile = File(...), db: Session = Depends(get_db)):
         raise HTTPException(status_code=500, detail=str(e))
 
 
+def _expand_uploads(uploads):
+    entries = (entry for filename, contents in uploads
+               for entry in iter_upload_images(filename, io.BytesIO(contents),
+                                               config.PREDICT_ARCHIVE_MEMBER_MAX_MB << 20))
+    return list(limit_images(entries, config.PREDICT_BATCH_MAX_IMAGES, config.PREDICT_BATCH_MAX_MB << 20))
+
+
+async def _predict_images(images):
+    """Cache lookup, inference of the misses, upload persistence and a one-transaction
+    insert for a list of (name, image_bytes). The caller must hold an inference slot.
+    Returns one result dict per image, in order."""
+    lookups = await run_in_threadpool(lambda: [_lookup_cached(contents) for _, contents in images])
+    misses = [i for i, (_, _, cached) in enumerate(lookups) if cached is None]
+    # persist the uploads while the model runs
+    saving = run_in_threadpool(lambda: [
+        _save_upload(name, contents, lookups[i][0]) for i, (name, contents) in enumerate(images)
+    ])
+    outcomes = [cached for _, _, cached in lookups]
+    if misses:
+        predicted = inference.run_images([images[i][1] for i in misses], config.PREDICT_BATCH_SIZE)
+        predicted_misses, saved_paths = await asyncio.gather(predicted, saving)
+        # lookups made while the model was loading carry no version yet
+        lookups = [(content_hash, model_version or predictor.model_version(), cached)
+                   for content_hash, model_version, cached in lookups]
+        for i, outcome in zip(misses, predicted_misses):
+            outcomes[i] = outcome
+            if not isinstance(outcome, str):
+                prediction_cache.put(lookups[i][:2], outcome)
+    else:
+        saved_paths = await saving
+
+    rows = []
+    for i, outcome in enumerate(outcomes):
+        if isinstance(outcome, str):
+            continue
+        content_hash, model_version, _ = lookups[i]
+        rows.append(dict(
+            filename=images[i][0],
+            image_path=saved_paths[i],
+            predicted_label=outcome[0],
+            probabilities=outcome[1],
+            content_hash=content_hash,
+            model_version=model_version,
+        ))
+    stored = iter(await _store_predictions(rows))
+
+    results = []
+    for i, outcome in enumerate(outcomes):
+        if isinstance(outcome, str):
+            results.append({"filename": images[i][0], "error": outcome})
+            continue
+        item_id, created_at = next(stored)
+        results.append({
+            "id": item_id,
+            "filename": images[i][0],
+            "predicted_label": outcome[0],
+            "probabilities": outcome[1],
+            "created_at": isoformat_utc(created_at),
+            "cached": lookups[i][2] is not None,
+        })
+    return results
+
+
+def _acquire_inference_slot():
+    try:
+        inference.acquire()
+    except InferenceQueueFull:
+        raise HTTPException(status_code=503, detail='Inference queue is full, retry shortly',
+                            headers={"Retry-After": "1"})
+
+
+@app.post('/predict/batch')
+async def predict_batch(files: List[UploadFile] = File(...)):
+    uploads = [(f.filename, await f.read()) for f in files]
+    try:
+        images = await run_in_threadpool(_expand_uploads, uploads)
+    except (ValueError, OSError) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if not images:
+        raise HTTPException(status_code=400, detail='No images found in upload')
+    _acquire_inference_slot()
+    try:
+        results = await _predict_images(images)
+        study = summarize_study(results)
+        study["recommendations"] = _get_recommendations().get(study["predicted_label"], {})
+        return JSONResponse({"study": study, "results": results})
+    except Exception as e:
+        import traceback
+        print("ERROR in /predict/batch:", str(e))
+        print(traceback.format_exc())
+        raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        inference.release()
+
+
+async def _spool_upload(file: UploadFile):
+    # copy to our own temp file: the request's upload may be closed before streaming ends
+    spooled = tempfile.TemporaryFile()
+    while True:
+        chunk = await file.read(1 << 20)
+        if not chunk:
+            break
+        spooled.write(chunk)
+    spooled.seek(0)
+    return file.filename, spooled
+
+
+def _next_chunk(images, size):
+    chunk = []
+    for entry in images:
+        chunk.append(entry)
+        if len(chunk) >= size:
+            break
+    return chunk
+
+
+def _has_more(images):
+    # at the cap, the upload was only cut short if another image remains
+    try:
+        return bool(_next_chunk(images, 1))
+    except ValueError:
+        # an over-sized member past the cap: it was never going to be processed
+        return True
+
+
+def _iter_spooled_images(spooled):
+    for filename, fileobj in spooled:
+        yield from iter_upload_images(filename, fileobj, config.PREDICT_ARCHIVE_MEMBER_MAX_MB << 20)
+
+
+def _stream_cleanup(spooled):
+    """Releases the inference slot and closes the spooled uploads, once.
+
+    Called from the stream's `finally` and again as the response's background
+    task, which also runs when the client disconnects before the stream starts.
+    """
+    lock = threading.Lock()
+    done = [False]
+
+    def cleanup():
+        with lock:
+            if done[0]:
+                return
+            done[0] = True
+        inference.release()
+        for _, fileobj in spooled:
+            fileobj.close()
+
+    return cleanup
+
+
+def _encode_record(record, fmt):
+    body = json.dumps(record)
+    if fmt == 'sse':
+        return f"event: {record['type']}\ndata: {body}\n\n"
+    return body + "\n"
+
+
+async def _stream_predictions(spooled, fmt, cleanup):
+    aggregate = StudyAggregate()
+    images = _iter_spooled_images(spooled)
+    index = 0
+    try:
+        while index < config.PREDICT_BATCH_MAX_IMAGES:
+            # only one chunk of images is decoded/in memory at a time
+            size = min(config.PREDICT_BATCH_SIZE, config.PREDICT_BATCH_MAX_IMAGES - index)
+            chunk = await run_in_threadpool(_next_chunk, images, size)
+            if not chunk:
+                break
+            for result in await _predict_images(chunk):
+                aggregate.add(result)
+                yield _encode_record({"type": "result", "index": index, **result}, fmt)
+                index += 1
+        study = aggregate.summary()
+        study["recommendations"] = _get_recommendations().get(study["predicted_label"], {})
+        if index >= config.PREDICT_BATCH_MAX_IMAGES and await run_in_threadpool(_has_more, images):
+            study["truncated"] = True
+        yield _encode_record({"type": "study", **study}, fmt)
+    except Exception as e:
+        import traceback
+        print("ERROR in /predict/stream:", str(e))
+        print(traceback.format_exc())
+        yield _encode_record({"type": "error", "detail": str(e)}, fmt)
+    finally:
+        cleanup()
+
+
+@app.post('/predict/stream')
+async def predict_stream(files: List[UploadFile] = File(...), format: str = 'ndjson'):
+    """Like /predict/batch, but emits one NDJSON (or SSE with ?format=sse) record per image
+    as soon as its batch finishes, followed by a final "study" record."""
+    if format not in ('ndjson', 'sse'):
+        raise HTTPException(status_code=400, detail="format must be 'ndjson' or 'sse'")
+    spooled = [await _spool_upload(f) for f in files]
+    try:
+        _acquire_inference_slot()
+    except HTTPException:
+        for _, fileobj in spooled:
+            fileobj.close()
+        raise
+    media_type = 'text/event-stream' if format == 'sse' else 'application/x-ndjson'
+    cleanup = _stream_cleanup(spooled)
+    return StreamingResponse(_stream_predictions(spooled, format, cleanup), media_type=media_type,
+                             background=BackgroundTask(cleanup))
+
+
+HISTORY_PAGE_MAX = 200
+
+
+def _encode_cursor(created_at, item_id):
+    raw = json.dumps([created_at.isoformat(), item_id]).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def _decode_cursor(cursor):
+    try:
+        created_at, item_id = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+        return datetime.fromisoformat(created_at), str(item_id)
+    except Exception:
+        raise HTTPException(status_code=400, detail='Invalid cursor')
+
+
+def _as_stored_datetime(value):
+    # timestamps are stored in UTC; compare like with like
+    if value is not None and value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
 @app.get('/history')
-def history(db: Session = Depends(get_db)):
-    rows = db.query(Prediction).order_by(Prediction.created_at.desc()).limit(50).all()
-    out = []
-    for r in rows:
-        out.append({
+def history(
+    limit: int = Query(50, ge=1, le=HISTORY_PAGE_MAX),
+    cursor: Optional[str] = None,
+    label: Optional[str] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    db: Session = Depends(get_db),
+):
+    """Newest-first predictions, keyset-paginated.
+
+    Pass `next_cursor` from a page as `cursor` to get the following one;
+    `label` and the `since` (inclusive) / `until` (exclusive) range filter.
+    Only the listed columns are read and every page is an index range scan
+    on (predicted_label,) created_at, id, so the cost depends on the page
+    size rather than on the number of stored predictions.
+    """
+    q = db.query(Prediction.id, Prediction.filename, Prediction.predicted_label, Prediction.created_at)
+    if label is not None:
+        q = q.filter(Prediction.predicted_label == label)
+    if since is not None:
+        q = q.filter(Prediction.created_at >= _as_stored_datetime(since))
+    if until is not None:
+        q = q.filter(Prediction.created_at < _as_stored_datetime(until))
+    if cursor:
+        created_at, item_id = _decode_cursor(cursor)
+        q = q.filter(or_(
+            Prediction.created_at < created_at,
+            and_(Prediction.created_at == created_at, Prediction.id < item_id),
+        ))
+    rows = q.order_by(Prediction.created_at.desc(), Prediction.id.desc()).limit(limit + 1).all()
+    page = rows[:limit]
+    return {
+        "items": [{
             "id": r.id,
             "filename": r.filename,
             "predicted_label": r.predicted_label,
-            "created_at": r.created_at.isoformat()
-        })
-    return out
+            "created_at": isoformat_utc(r.created_at)
+        } for r in page],
+        "next_cursor": _encode_cursor(page[-1].created_at, page[-1].id) if len(rows) > limit else None,
+    }
+
+
+@app.get('/analytics')
+def analytics_summary(
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    label: Optional[str] = None,
+    model_version: Optional[str] = None,
+    bucket: str = Query('day', pattern='^(hour|day|week|month)$'),
+    bins: int = Query(10, ge=2, le=100),
+    low_confidence: float = Query(0.6, ge=0.0, le=1.0),
+    db: Session = Depends(get_db),
+):
+    """Label distribution, confidence histograms and a time series, computed in SQL"""
+    return analytics.compute(
+        db, _as_stored_datetime(since), _as_stored_datetime(until), label, model_version,
+        bucket, bins, low_confidence)
 
 
 @app.get('/history/{item_id}')
@@ -137,22 +708,49 @@ def history_item(item_id: str, db: Session = Depends(get_db)):
     r = db.query(Prediction).filter(Prediction.id == item_id).first()
     if not r:
         raise HTTPException(status_code=404, detail='Not found')
-    # read image file and return base64
-    img_b64 = None
-    if r.image_path and os.path.exists(r.image_path):
-        with open(r.image_path, 'rb') as f:
-            img_b64 = base64.b64encode(f.read()).decode('utf-8')
+    has_original = bool(r.image_path) and os.path.exists(r.image_path)
+    has_preview = r.content_hash is not None and os.path.exists(blob_store.preview_path(r.content_hash))
     return {
         "id": r.id,
         "filename": r.filename,
         "predicted_label": r.predicted_label,
         "probabilities": json.loads(r.probabilities_json),
-        "created_at": r.created_at.isoformat(),
-        "image_base64": img_b64,
+        "created_at": isoformat_utc(r.created_at),
+        # history views show the small preview; the original only on demand
+        "image_url": f"/history/{r.id}/image" if has_preview or has_original else None,
+        "original_url": f"/history/{r.id}/image?variant=original" if has_original else None,
         "recommendations": _get_recommendations().get(r.predicted_label, {})
     }
 
 
+@app.get('/history/{item_id}/image')
+def history_item_image(item_id: str, request: Request,
+                       variant: str = Query('preview', pattern='^(preview|original|input)$'),
+                       db: Session = Depends(get_db)):
+    r = db.query(Prediction.image_path, Prediction.content_hash).filter(Prediction.id == item_id).first()
+    if r is None:
+        raise HTTPException(status_code=404, detail='Not found')
+    path = None
+    if variant == 'original' or r.content_hash is None:
+        # uploads stored before the blob store have no derivatives
+        path = r.image_path
+    elif variant == 'preview':
+        # made on first view for uploads stored before previews existed
+        path = blob_store.ensure_preview(r.content_hash, r.image_path)
+    else:
+        # only made when asked for; inference decodes the upload itself
+        path = blob_store.ensure_input(r.content_hash, r.image_path)
+    if not path or not os.path.exists(path):
+        raise HTTPException(status_code=404, detail='Not found')
+    # the stored upload of a prediction never changes, so its identity is the ETag
+    # (no hashing of the file); private since it is patient data
+    version = r.content_hash[:32] if r.content_hash else item_id
+    if variant == 'preview' and r.content_hash:
+        version += '-' + blob_store.preview_format
+    etag = f'"{version}-{variant}"'
+    return _file_response(request, path, f"private, {IMMUTABLE_CACHE_CONTROL}", etag)
+
+
 def _get_recommendations():
     # EXACT structure required: four keys with title and 5 items
     return {
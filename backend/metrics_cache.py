@@ -0,0 +1,102 @@
+import gzip
+import hashlib
+import json
+import os
+import threading
+import time
+
+
+_digests = {}
+_digests_lock = threading.Lock()
+
+
+def file_digest(path):
+    """sha256 of a file, recomputed only when its (mtime, size) changes; None if missing"""
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    key = (st.st_mtime_ns, st.st_size)
+    cached = _digests.get(path)
+    if cached is not None and cached[0] == key:
+        return cached[1]
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            h.update(chunk)
+    digest = h.hexdigest()
+    with _digests_lock:
+        _digests[path] = (key, digest)
+    return digest
+
+
+class CachedPayload:
+    """A JSON body, plain and gzipped; each encoding gets its own strong ETag"""
+    __slots__ = ('etag', 'gzip_etag', 'body', 'gzip_body')
+
+    def __init__(self, body):
+        self.body = body
+        digest = hashlib.sha256(body).hexdigest()[:32]
+        self.etag = f'"{digest}"'
+        self.gzip_etag = f'"{digest}-gzip"'
+        self.gzip_body = gzip.compress(body, compresslevel=6)
+
+
+def etag_matches(if_none_match, etag):
+    """If-None-Match check: a comma-separated list of tags, weak (W/) tags compared weakly, or *"""
+    if not if_none_match:
+        return False
+    for tag in if_none_match.split(','):
+        tag = tag.strip()
+        if tag == '*':
+            return True
+        if tag.startswith('W/'):
+            tag = tag[2:]
+        if tag == etag:
+            return True
+    return False
+
+
+class ArtifactPayloadCache:
+    """Serves a JSON payload derived from artifact files, rebuilt only when they change.
+
+    The artifact version is the (mtime, size) of every path, re-checked at most
+    every `check_interval` seconds, so a rewrite by generate_artifacts.py is
+    picked up automatically. The payload is kept pre-serialized (plain and
+    gzip) together with a content ETag.
+    """
+
+    def __init__(self, paths, build, check_interval=1.0):
+        self._paths = list(paths)
+        self._build = build
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._version = None
+        self._payload = None
+        self._checked_at = 0.0
+        self.builds = 0
+
+    def _current_version(self):
+        version = []
+        for path in self._paths:
+            try:
+                st = os.stat(path)
+                version.append((path, st.st_mtime_ns, st.st_size))
+            except FileNotFoundError:
+                version.append((path, None, None))
+        return tuple(version)
+
+    def get(self):
+        now = time.monotonic()
+        payload = self._payload
+        if payload is not None and now - self._checked_at < self.check_interval:
+            return payload
+        with self._lock:
+            version = self._current_version()
+            self._checked_at = now
+            if self._payload is None or version != self._version:
+                body = json.dumps(self._build(), separators=(',', ':')).encode('utf-8')
+                self._payload = CachedPayload(body)
+                self._version = version
+                self.builds += 1
+            return self._payload
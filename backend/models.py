@@ -1,4 +1,6 @@
-from sqlalchemy import Column, String, DateTime, Text
+from datetime import datetime, timezone
+import json
+from sqlalchemy import Column, String, DateTime, Text, Index, ForeignKey, bindparam, select, update
 from sqlalchemy.dialects.sqlite import JSON as SQLITE_JSON
 from sqlalchemy.types import Float
 from sqlalchemy.sql import func
@@ -6,6 +8,17 @@ from .db import Base
 import uuid
 
 
+def utcnow():
+    return datetime.now(timezone.utc)
+
+
+def isoformat_utc(value):
+    """ISO 8601 with an explicit +00:00 offset; SQLite hands stored UTC timestamps back naive"""
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc).isoformat()
+
+
 class Prediction(Base):
     __tablename__ = 'predictions'
     id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
@@ -13,4 +26,76 @@ class Prediction(Base):
     image_path = Column(String, nullable=True)
     predicted_label = Column(String, nullable=False)
     probabilities_json = Column(Text, nullable=False)
-    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    # sha256 of the uploaded bytes + model that produced the result, for the prediction cache
+    content_hash = Column(String, nullable=True, index=True)
+    model_version = Column(String, nullable=True, index=True)
+    # highest class probability; per-class values live in prediction_probabilities
+    max_confidence = Column(Float, nullable=True, index=True)
+    # set in Python (microsecond precision, the same format as query parameters);
+    # the server default only covers rows inserted outside the ORM
+    created_at = Column(DateTime(timezone=True), default=utcnow, server_default=func.now())
+
+    __table_args__ = (
+        # /history: newest first, keyset-paginated on (created_at, id), optionally per label
+        Index('ix_predictions_created_at_id', 'created_at', 'id'),
+        Index('ix_predictions_label_created_at_id', 'predicted_label', 'created_at', 'id'),
+    )
+
+
+class PredictionProbability(Base):
+    """One row per (prediction, class): the per-class probabilities in queryable form"""
+    __tablename__ = 'prediction_probabilities'
+    prediction_id = Column(String, ForeignKey('predictions.id', ondelete='CASCADE'), primary_key=True)
+    label = Column(String, primary_key=True)
+    probability = Column(Float, nullable=False)
+
+    __table_args__ = (
+        Index('ix_prediction_probabilities_label_probability', 'label', 'probability'),
+    )
+
+
+def probability_rows(prediction_id, probabilities):
+    return [{"prediction_id": prediction_id, "label": label, "probability": float(p)}
+            for label, p in probabilities.items()]
+
+
+def backfill_probabilities(bind, batch_size=1000):
+    """Fills max_confidence and prediction_probabilities for rows stored before they existed.
+
+    Works in keyset-ordered batches of `batch_size`, one transaction each, so
+    it can be interrupted and resumed; rows already done are skipped by the
+    (indexed) max_confidence IS NULL filter. Returns the number of rows migrated.
+    """
+    predictions = Prediction.__table__
+    migrated, last_id = 0, ''
+    while True:
+        with bind.begin() as conn:
+            batch = conn.execute(
+                select(predictions.c.id, predictions.c.probabilities_json)
+                .where(predictions.c.max_confidence.is_(None), predictions.c.id > last_id)
+                .order_by(predictions.c.id)
+                .limit(batch_size)
+            ).all()
+            if not batch:
+                return migrated
+            children, maxima = [], []
+            for item_id, probabilities_json in batch:
+                try:
+                    probabilities = json.loads(probabilities_json)
+                except (TypeError, ValueError):
+                    continue
+                if not probabilities:
+                    continue
+                children.extend(probability_rows(item_id, probabilities))
+                maxima.append({"_id": item_id, "_max": float(max(probabilities.values()))})
+            if children:
+                # a retried batch may already hold some child rows
+                conn.execute(PredictionProbability.__table__.delete().where(
+                    PredictionProbability.prediction_id.in_([m["_id"] for m in maxima])))
+                conn.execute(PredictionProbability.__table__.insert(), children)
+                conn.execute(
+                    update(predictions).where(predictions.c.id == bindparam("_id"))
+                    .values(max_confidence=bindparam("_max")),
+                    maxima)
+            migrated += len(maxima)
+            last_id = batch[-1][0]
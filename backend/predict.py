@@ -1,31 +1,28 @@
-import io
 import os
 import json
-import base64
+import hashlib
+import threading
+import time
 from uuid import uuid4
-from PIL import Image
 import numpy as np
-import tensorflow as tf
 
-
-class FocalLoss(tf.keras.losses.Loss):
-    def __init__(self, gamma=2., alpha=0.25, **kwargs):
-        super(FocalLoss, self).__init__(**kwargs)
-        self.gamma = gamma
-        self.alpha = alpha
-
-    def call(self, y_true, y_pred):
-        y_pred = tf.clip_by_value(y_pred, 1e-7, 1.0 - 1e-7)
-        cross_entropy = -y_true * tf.math.log(y_pred)
-        weight = self.alpha * tf.math.pow(1 - y_pred, self.gamma)
-        return tf.reduce_sum(weight * cross_entropy, axis=1)
+from . import config
+from . import preprocess
+from . import runtimes
+from . import metrics_cache
+from . import telemetry
+from .batching import MicroBatcher
 
 
 ARTIFACTS_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), "artifacts")
 MODEL_PATH = os.path.join(ARTIFACTS_DIR, "brain_model.h5")
+# optimized CPU exports written by export_model.py
+TFLITE_MODEL_PATH = os.path.join(ARTIFACTS_DIR, "brain_model_dynamic.tflite")
+ONNX_MODEL_PATH = os.path.join(ARTIFACTS_DIR, "brain_model.onnx")
 CLASS_INDICES_PATH = os.path.join(ARTIFACTS_DIR, "class_indices.json")
 METRICS_PATH = os.path.join(ARTIFACTS_DIR, "metrics.json")
 CM_PATH = os.path.join(ARTIFACTS_DIR, "confusion_matrix.npy")
+CLASSIFICATION_REPORT_PATH = os.path.join(ARTIFACTS_DIR, "classification_report.json")
 
 # All visualization images
 VISUALIZATION_IMAGES = {
@@ -39,42 +36,228 @@ VISUALIZATION_IMAGES = {
     "performance_summary": os.path.join(ARTIFACTS_DIR, "performance_summary.png"),
 }
 
+# Every file get_saved_metrics() reads, for cache invalidation
+METRICS_ARTIFACT_PATHS = [METRICS_PATH, CLASSIFICATION_REPORT_PATH, CM_PATH] + list(VISUALIZATION_IMAGES.values())
+PLOTS_ARTIFACT_PATHS = [VISUALIZATION_IMAGES["confusion_matrix"], VISUALIZATION_IMAGES["training_curves"]]
+
+
+INPUT_SHAPE = preprocess.INPUT_SHAPE
+KERAS_BACKENDS = ('function', 'call', 'predict')
+INFERENCE_BACKENDS = KERAS_BACKENDS + ('tflite', 'onnx')
 
 # Load model singleton
-_model = None
+_runner = None
 _labels = None
+_model_version = None
+_load_lock = threading.Lock()
+_batcher = None
+# readiness state reported by /health
+_ready = False
+_load_seconds = None
+_warmup_seconds = None
+_startup_error = None
+
+
+def model_path_for(backend):
+    """Model file a given inference backend loads"""
+    if backend == 'tflite':
+        return config.TFLITE_MODEL_PATH or TFLITE_MODEL_PATH
+    if backend == 'onnx':
+        return config.ONNX_MODEL_PATH or ONNX_MODEL_PATH
+    return MODEL_PATH
+
+
+def load_keras_model(path=MODEL_PATH):
+    # TensorFlow is imported here, not at module load: the API process only
+    # pays for it when it actually runs a Keras backend
+    import tensorflow as tf
+
+    class FocalLoss(tf.keras.losses.Loss):
+        def __init__(self, gamma=2., alpha=0.25, **kwargs):
+            super(FocalLoss, self).__init__(**kwargs)
+            self.gamma = gamma
+            self.alpha = alpha
+
+        def call(self, y_true, y_pred):
+            y_pred = tf.clip_by_value(y_pred, 1e-7, 1.0 - 1e-7)
+            cross_entropy = -y_true * tf.math.log(y_pred)
+            weight = self.alpha * tf.math.pow(1 - y_pred, self.gamma)
+            return tf.reduce_sum(weight * cross_entropy, axis=1)
+
+    return tf.keras.models.load_model(path, custom_objects={"FocalLoss": FocalLoss})
+
+
+def build_runner(backend, model=None):
+    """Returns a callable mapping a float32 (N, 224, 224, 1) array to (N, n_classes) probabilities.
+
+    Keras backends reuse `model` when given, otherwise load brain_model.h5.
+    """
+    if backend == 'tflite':
+        return runtimes.TFLiteRunner(model_path_for(backend), config.INFERENCE_NUM_THREADS)
+    if backend == 'onnx':
+        return runtimes.OnnxRunner(model_path_for(backend), config.INFERENCE_NUM_THREADS)
+    if backend not in KERAS_BACKENDS:
+        raise ValueError(f"Unknown inference backend {backend!r}, expected one of {INFERENCE_BACKENDS}")
+    if model is None:
+        model = load_keras_model()
+    if backend == 'predict':
+        return lambda x: model.predict(x, verbose=0)
+    if backend == 'call':
+        return lambda x: model(x, training=False).numpy()
+    # 'function': one trace covers every batch size thanks to the unknown leading dim
+    import tensorflow as tf
+    fn = tf.function(
+        lambda x: model(x, training=False),
+        input_signature=[tf.TensorSpec((None,) + INPUT_SHAPE, tf.float32)],
+    )
+    return lambda x: fn(tf.convert_to_tensor(x, dtype=tf.float32)).numpy()
 
 
 def _ensure_loaded():
-    global _model, _labels
-    if _model is None:
-        if not os.path.exists(MODEL_PATH):
-            raise FileNotFoundError(f"Model file not found at {MODEL_PATH}")
-        _model = tf.keras.models.load_model(MODEL_PATH, custom_objects={"FocalLoss": FocalLoss})
-    if _labels is None:
-        if os.path.exists(CLASS_INDICES_PATH):
-            with open(CLASS_INDICES_PATH, 'r') as f:
-                class_indices = json.load(f)
-            # invert mapping
-            _labels = {v: k for k, v in class_indices.items()}
-        else:
-            _labels = {}
-
-
-def _preprocess_image_bytes(image_bytes):
-    img = Image.open(io.BytesIO(image_bytes)).convert('L')  # grayscale
-    img = img.resize((224, 224))
-    arr = np.asarray(img).astype('float32') / 255.0
-    arr = arr.reshape((1, 224, 224, 1))
-    return arr
+    global _runner, _labels, _load_seconds, _model_version
+    if _runner is not None and _labels is not None:
+        return
+    with _load_lock:
+        if _runner is None:
+            model_path = model_path_for(config.INFERENCE_BACKEND)
+            if not os.path.exists(model_path):
+                raise FileNotFoundError(f"Model file not found at {model_path}")
+            start = time.perf_counter()
+            if config.INFERENCE_PROCESSES > 0:
+                _runner = _start_worker_pool()
+            else:
+                _runner = build_runner(config.INFERENCE_BACKEND)
+            _model_version = _file_digest(model_path)[:16]
+            _load_seconds = time.perf_counter() - start
+        if _labels is None:
+            if os.path.exists(CLASS_INDICES_PATH):
+                with open(CLASS_INDICES_PATH, 'r') as f:
+                    class_indices = json.load(f)
+                # invert mapping
+                _labels = {v: k for k, v in class_indices.items()}
+            else:
+                _labels = {}
+
+
+def _start_worker_pool():
+    from .workers import WorkerPool
+    # the output arena is sized up front, and loading the model here just to
+    # read its output shape would pull TensorFlow into the API process
+    if not os.path.exists(CLASS_INDICES_PATH):
+        raise FileNotFoundError(
+            f"{CLASS_INDICES_PATH} is required with INFERENCE_PROCESSES > 0 (it gives the number of classes)")
+    with open(CLASS_INDICES_PATH, 'r') as f:
+        n_outputs = len(json.load(f))
+    return WorkerPool(
+        config.INFERENCE_PROCESSES,
+        config.INFERENCE_BACKEND,
+        max_batch_size=max(config.BATCH_MAX_SIZE, config.PREDICT_BATCH_SIZE),
+        n_outputs=n_outputs,
+        input_shape=INPUT_SHAPE,
+        slots=config.INFERENCE_POOL_SLOTS,
+        intra_threads=config.INFERENCE_PROCESS_THREADS,
+    )
+
+
+def _file_digest(path):
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def model_version():
+    """Short content hash of the loaded model file, used to key cached predictions.
+
+    Computed once at load time; None until the model is loaded. Never loads
+    it, so the request path does not block on a model still warming up.
+    """
+    return _model_version
+
+
+def _get_batcher():
+    global _batcher
+    if _batcher is None:
+        with _load_lock:
+            if _batcher is None:
+                _batcher = MicroBatcher(
+                    predict_batch,
+                    max_batch_size=config.BATCH_MAX_SIZE,
+                    max_wait_ms=config.BATCH_MAX_WAIT_MS,
+                    concurrency=max(1, config.INFERENCE_PROCESSES),
+                )
+    return _batcher
+
+
+def preprocess_image_bytes(image_bytes):
+    return preprocess.preprocess(image_bytes)
+
+
+def predict_batch(x):
+    """Runs one forward pass over a (N, 224, 224, 1) batch, returns (N, n_classes) probabilities"""
+    _ensure_loaded()
+    telemetry.BATCH_SIZE.observe(x.shape[0])
+    with telemetry.stage('model_forward'):
+        return _runner(x)
+
+
+def warmup(batch_sizes=(1,), iterations=1):
+    """Loads the model and pushes dummy batches through it so tracing happens before real traffic.
+
+    Marks the predictor ready once done and returns the load/warm-up timings.
+    """
+    global _ready, _warmup_seconds, _startup_error
+    try:
+        _ensure_loaded()
+        start = time.perf_counter()
+        for n in batch_sizes:
+            x = np.zeros((n,) + INPUT_SHAPE, dtype='float32')
+            for _ in range(max(1, iterations)):
+                _runner(x)
+        _warmup_seconds = time.perf_counter() - start
+    except Exception as e:
+        _startup_error = str(e)
+        raise
+    _ready = True
+    return readiness()
+
+
+def readiness():
+    # a worker pool that lost every worker can no longer serve
+    pool_healthy = _runner.healthy() if hasattr(_runner, 'healthy') else True
+    return {
+        "ready": _ready and pool_healthy,
+        "inference_backend": config.INFERENCE_BACKEND,
+        "model_path": model_path_for(config.INFERENCE_BACKEND),
+        "model_version": _model_version,
+        "load_seconds": _load_seconds,
+        "warmup_seconds": _warmup_seconds,
+        "error": _startup_error if pool_healthy else (_startup_error or "No inference worker is available"),
+    }
 
 
 def predict_image(image_bytes):
-    """Returns (predicted_label, probabilities_dict, predicted_index)"""
+    """Returns (predicted_label, probabilities_dict, predicted_index)
+
+    The forward pass goes through the micro-batcher, so concurrent callers
+    share a single `predict` call.
+    """
     _ensure_loaded()
-    x = _preprocess_image_bytes(image_bytes)
-    preds = _model.predict(x)
-    preds = preds[0].tolist()
+    x = preprocess_image_bytes(image_bytes)
+    preds = submit(x).result()
+    return postprocess(preds)
+
+
+def submit(x):
+    """Queues a preprocessed (1, 224, 224, 1) image on the micro-batcher, returns a concurrent Future"""
+    _ensure_loaded()
+    return _get_batcher().submit(x)
+
+
+def postprocess(preds):
+    """Maps one row of model outputs to (predicted_label, probabilities_dict, predicted_index)"""
+    preds = np.asarray(preds).tolist()
     # map indices to labels
     labels = [None] * len(preds)
     for i in range(len(preds)):
@@ -85,29 +268,62 @@ def predict_image(image_bytes):
     return predicted_label, prob_dict, predicted_index
 
 
+def batching_stats():
+    if _batcher is None:
+        return None
+    return _batcher.stats()
+
+
+def worker_pool_stats():
+    if hasattr(_runner, 'stats'):
+        return _runner.stats()
+    return None
+
+
+def shutdown():
+    if _batcher is not None:
+        _batcher.stop()
+    if hasattr(_runner, 'close'):
+        _runner.close()
+
+
+def image_url(key):
+    """Versioned URL of a visualization image, served by GET /metrics/images/{key}"""
+    digest = metrics_cache.file_digest(VISUALIZATION_IMAGES[key])
+    if digest is None:
+        return None
+    return f"/metrics/images/{key}?v={digest[:16]}"
+
+
 def get_saved_metrics():
     out = {}
     if os.path.exists(METRICS_PATH):
         with open(METRICS_PATH, 'r') as f:
             out.update(json.load(f))
     # classification report
-    cr_path = os.path.join(ARTIFACTS_DIR, "classification_report.json")
-    if os.path.exists(cr_path):
-        with open(cr_path, 'r') as f:
+    if os.path.exists(CLASSIFICATION_REPORT_PATH):
+        with open(CLASSIFICATION_REPORT_PATH, 'r') as f:
             out['classification_report'] = json.load(f)
     # confusion matrix
     if os.path.exists(CM_PATH):
         out['confusion_matrix'] = np.load(CM_PATH).tolist()
-    
-    # Load all visualization images as base64
-    for key, img_path in VISUALIZATION_IMAGES.items():
-        if os.path.exists(img_path):
-            with open(img_path, 'rb') as f:
-                out[f'{key}_base64'] = base64.b64encode(f.read()).decode('utf-8')
-    
+
+    # visualization images are separate cacheable resources
+    for key in VISUALIZATION_IMAGES:
+        url = image_url(key)
+        if url is not None:
+            out[f'{key}_url'] = url
+
     return out
 
 
+def get_saved_plots():
+    return {
+        "confusion_matrix_png_url": image_url("confusion_matrix"),
+        "training_curves_png_url": image_url("training_curves"),
+    }
+
+
 if __name__ == '__main__':
     print('Test predict module load...')
     try:
@@ -0,0 +1,268 @@
+import asyncio
+import collections
+import json
+import os
+import re
+import shutil
+import sys
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+
+MODES = ('off', 'header', 'all')
+HEADER = b'x-profile'
+PROFILE_ID_RE = re.compile(r'^[0-9a-f]{32}$')
+SUMMARY_NAME = 'profile.json'
+STACKS_NAME = 'stacks.txt'
+TF_TRACE_DIR = 'tf_trace'
+TOP_N = 25
+
+# leaf frames of a thread parked on a lock, queue or selector: not doing work
+_IDLE_LEAVES = {
+    ('threading.py', 'wait'),
+    ('threading.py', '_wait_for_tstate_lock'),
+    ('queue.py', 'get'),
+    ('selectors.py', 'select'),
+    ('thread.py', '_worker'),
+}
+
+
+def _frame_key(code):
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class StackSampler:
+    """Samples the Python stack of every thread in the process at a fixed interval.
+
+    Work for one request spans the event loop, the decode executor, the
+    micro-batcher and the DB writer, so a profiler attached to the handler's
+    own thread would miss most of it. Samples are aggregated as collapsed
+    stacks ("thread;outer;...;leaf count", the flamegraph.pl / speedscope
+    input format). Under concurrent load other requests show up too.
+    """
+
+    def __init__(self, interval_ms=2.0):
+        self.interval = max(0.0005, interval_ms / 1000.0)
+        self.stacks = collections.Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='profile-sampler', daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        own = threading.get_ident()
+        while not self._stop.is_set():
+            names = {t.ident: t.name for t in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(frame.f_code)
+                    frame = frame.f_back
+                leaf = stack[0]
+                if (os.path.basename(leaf.co_filename), leaf.co_name) in _IDLE_LEAVES:
+                    continue
+                self.stacks[(names.get(ident, str(ident)),) + tuple(_frame_key(c) for c in reversed(stack))] += 1
+            self.samples += 1
+            self._stop.wait(self.interval)
+
+    def collapsed(self):
+        return ''.join(f"{';'.join(stack)} {n}\n" for stack, n in self.stacks.most_common())
+
+    def summary(self):
+        """Busy samples per thread and the top functions by self and cumulative samples"""
+        threads = collections.Counter()
+        own = collections.Counter()
+        cumulative = collections.Counter()
+        for stack, n in self.stacks.items():
+            threads[stack[0]] += n
+            own[stack[-1]] += n
+            for frame in set(stack[1:]):
+                cumulative[frame] += n
+        busy = sum(threads.values()) or 1
+        top = lambda counter: [
+            {"function": f, "samples": n, "percent": round(100.0 * n / busy, 1)}
+            for f, n in counter.most_common(TOP_N)
+        ]
+        return {
+            "samples": self.samples,
+            "interval_ms": self.interval * 1000.0,
+            "busy_samples_by_thread": dict(threads.most_common()),
+            "top_self": top(own),
+            "top_cumulative": top(cumulative),
+        }
+
+
+class _TFTrace:
+    """tf.profiler trace for the duration of a profile (viewable in TensorBoard's Profile tab)"""
+
+    def __init__(self, logdir):
+        self.logdir = logdir
+        self.error = None
+        self._started = False
+
+    def start(self):
+        try:
+            import tensorflow as tf
+            tf.profiler.experimental.start(self.logdir)
+            self._started = True
+        except Exception as e:
+            self.error = repr(e)
+
+    def stop(self):
+        if not self._started:
+            return
+        try:
+            import tensorflow as tf
+            tf.profiler.experimental.stop()
+        except Exception as e:
+            self.error = repr(e)
+
+
+class ProfileStore:
+    def __init__(self, root, keep=100):
+        self.root = root
+        self.keep = max(1, int(keep))
+
+    def path(self, profile_id):
+        if not PROFILE_ID_RE.match(profile_id):
+            return None
+        path = os.path.join(self.root, profile_id)
+        return path if os.path.isdir(path) else None
+
+    def new_dir(self, profile_id):
+        path = os.path.join(self.root, profile_id)
+        os.makedirs(path, exist_ok=True)
+        return path
+
+    def save(self, path, summary, collapsed):
+        with open(os.path.join(path, STACKS_NAME), 'w') as f:
+            f.write(collapsed)
+        with open(os.path.join(path, SUMMARY_NAME), 'w') as f:
+            json.dump(summary, f, indent=2)
+        self._prune()
+
+    def _entries(self):
+        try:
+            names = [n for n in os.listdir(self.root) if PROFILE_ID_RE.match(n)]
+        except FileNotFoundError:
+            return []
+        entries = []
+        for name in names:
+            try:
+                entries.append((os.stat(os.path.join(self.root, name)).st_mtime, name))
+            except FileNotFoundError:
+                continue
+        entries.sort(reverse=True)
+        return entries
+
+    def _prune(self):
+        for _, name in self._entries()[self.keep:]:
+            shutil.rmtree(os.path.join(self.root, name), ignore_errors=True)
+
+    def load(self, profile_id):
+        path = self.path(profile_id)
+        if path is None:
+            return None
+        try:
+            with open(os.path.join(path, SUMMARY_NAME)) as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def list(self, limit=50):
+        """Newest first, without the per-function tables"""
+        out = []
+        for _, name in self._entries()[:limit]:
+            summary = self.load(name)
+            if summary is None:
+                continue
+            out.append({k: v for k, v in summary.items() if k not in ('top_self', 'top_cumulative')})
+        return out
+
+
+class ProfilingMiddleware:
+    """ASGI middleware profiling matching requests (see PROFILE_* in config).
+
+    Only installed when profiling is enabled. At most one request is
+    profiled at a time; others pass through untouched. Profiled responses
+    carry an `X-Profile-Id` header naming the saved profile.
+    """
+
+    def __init__(self, app, store, mode='header', path_prefix='/predict', interval_ms=2.0, tf_trace=False):
+        if mode not in MODES:
+            raise ValueError(f"Unknown profiling mode {mode!r}, expected one of {MODES}")
+        self.app = app
+        self.store = store
+        self.mode = mode
+        self.path_prefix = path_prefix
+        self.interval_ms = interval_ms
+        self.tf_trace = tf_trace
+        self._busy = threading.Lock()
+
+    def _wanted(self, scope):
+        if scope['type'] != 'http' or not scope['path'].startswith(self.path_prefix):
+            return False
+        if self.mode == 'all':
+            return True
+        return any(k == HEADER and v.strip() in (b'1', b'true', b'yes') for k, v in scope['headers'])
+
+    async def __call__(self, scope, receive, send):
+        if not self._wanted(scope) or not self._busy.acquire(blocking=False):
+            await self.app(scope, receive, send)
+            return
+        try:
+            await self._profile(scope, receive, send)
+        finally:
+            self._busy.release()
+
+    async def _profile(self, scope, receive, send):
+        profile_id = uuid.uuid4().hex
+        path = self.store.new_dir(profile_id)
+        status = [500]
+
+        async def send_wrapper(message):
+            if message['type'] == 'http.response.start':
+                status[0] = message['status']
+                message = dict(message, headers=list(message.get('headers', [])) + [
+                    (b'x-profile-id', profile_id.encode())])
+            await send(message)
+
+        trace = _TFTrace(os.path.join(path, TF_TRACE_DIR)) if self.tf_trace else None
+        sampler = StackSampler(self.interval_ms)
+        started_at = datetime.now(timezone.utc)
+        loop = asyncio.get_running_loop()
+        if trace is not None:
+            # starting the profiler may import TensorFlow; keep it off the event loop too
+            await loop.run_in_executor(None, trace.start)
+        sampler.start()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            duration = time.perf_counter() - start
+            # a thread join and tf.profiler's trace export (can take seconds)
+            # must not stall the other requests on the event loop
+            await loop.run_in_executor(None, sampler.stop)
+            if trace is not None:
+                await loop.run_in_executor(None, trace.stop)
+            summary = {
+                "id": profile_id,
+                "method": scope['method'],
+                "path": scope['path'],
+                "status": status[0],
+                "started_at": started_at.isoformat(),
+                "duration_ms": duration * 1000.0,
+                "tf_trace": TF_TRACE_DIR if trace is not None and trace.error is None else None,
+                "tf_trace_error": trace.error if trace is not None else None,
+                **sampler.summary(),
+            }
+            await loop.run_in_executor(None, self.store.save, path, summary, sampler.collapsed())
@@ -0,0 +1,79 @@
+import threading
+
+import numpy as np
+
+
+def _tflite_interpreter_class():
+    # the standalone interpreter packages are a few MB; full TensorFlow is the fallback
+    try:
+        from tflite_runtime.interpreter import Interpreter
+    except ImportError:
+        try:
+            from ai_edge_litert.interpreter import Interpreter
+        except ImportError:
+            import tensorflow as tf
+            Interpreter = tf.lite.Interpreter
+    return Interpreter
+
+
+class TFLiteRunner:
+    """Runs a .tflite export (float, dynamic-range or int8 quantized) on CPU.
+
+    Uses tflite_runtime (or ai_edge_litert) when installed, so serving an
+    export does not need TensorFlow in the process at all.
+
+    The interpreter is not thread-safe and has a fixed input shape, so calls
+    are serialized and the input is resized whenever the batch size changes.
+    """
+
+    def __init__(self, model_path, num_threads=None):
+        Interpreter = _tflite_interpreter_class()
+        self._interpreter = Interpreter(model_path=model_path, num_threads=num_threads)
+        self._interpreter.allocate_tensors()
+        self._input = self._interpreter.get_input_details()[0]
+        self._output = self._interpreter.get_output_details()[0]
+        self._batch_size = int(self._input['shape'][0])
+        self._lock = threading.Lock()
+
+    def __call__(self, x):
+        with self._lock:
+            if x.shape[0] != self._batch_size:
+                self._interpreter.resize_tensor_input(self._input['index'], list(x.shape))
+                self._interpreter.allocate_tensors()
+                self._input = self._interpreter.get_input_details()[0]
+                self._output = self._interpreter.get_output_details()[0]
+                self._batch_size = x.shape[0]
+            self._interpreter.set_tensor(self._input['index'], _quantize(x, self._input))
+            self._interpreter.invoke()
+            return _dequantize(self._interpreter.get_tensor(self._output['index']), self._output)
+
+
+class OnnxRunner:
+    """Runs a .onnx export with onnxruntime's CPU provider"""
+
+    def __init__(self, model_path, num_threads=None):
+        import onnxruntime as ort
+        options = ort.SessionOptions()
+        if num_threads:
+            options.intra_op_num_threads = num_threads
+        self._session = ort.InferenceSession(model_path, options, providers=['CPUExecutionProvider'])
+        self._input_name = self._session.get_inputs()[0].name
+
+    def __call__(self, x):
+        return self._session.run(None, {self._input_name: x})[0]
+
+
+def _quantize(x, details):
+    # only int8/uint8 *interfaces* need this; float-interface int8 models quantize internally
+    if details['dtype'] == np.float32:
+        return x
+    scale, zero_point = details['quantization']
+    info = np.iinfo(details['dtype'])
+    return np.clip(np.round(x / scale + zero_point), info.min, info.max).astype(details['dtype'])
+
+
+def _dequantize(y, details):
+    if details['dtype'] == np.float32:
+        return y.copy()
+    scale, zero_point = details['quantization']
+    return (y.astype(np.float32) - zero_point) * scale
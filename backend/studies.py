@@ -0,0 +1,109 @@
+import io
+import os
+import tarfile
+import zipfile
+
+IMAGE_EXTENSIONS = {'.png', '.jpg', '.jpeg', '.bmp', '.tif', '.tiff', '.webp'}
+
+
+def _is_image_name(name):
+    base = os.path.basename(name)
+    return not base.startswith('.') and os.path.splitext(base)[1].lower() in IMAGE_EXTENSIONS
+
+
+def _bounded_read(fileobj, name, max_bytes):
+    # read one byte past the cap, so a header that understates the size is caught too
+    data = fileobj.read() if max_bytes is None else fileobj.read(max_bytes + 1)
+    if max_bytes is not None and len(data) > max_bytes:
+        raise ValueError(f"Archive member {name} is larger than {max_bytes // (1 << 20)} MB")
+    return data
+
+
+def _check_size(name, size, max_bytes):
+    if max_bytes is not None and size > max_bytes:
+        raise ValueError(f"Archive member {name} is larger than {max_bytes // (1 << 20)} MB")
+
+
+def iter_upload_images(filename, fileobj, max_member_bytes=None):
+    """Yields (name, image_bytes) for one uploaded file, reading entries lazily.
+
+    Zip and tar (optionally compressed) archives are expanded to the image
+    files they contain; anything else is treated as a single image. `fileobj`
+    must be seekable. An archive member decompressing to more than
+    `max_member_bytes` raises ValueError before it is held in memory.
+    """
+    if zipfile.is_zipfile(fileobj):
+        fileobj.seek(0)
+        with zipfile.ZipFile(fileobj) as zf:
+            for info in zf.infolist():
+                if not info.is_dir() and _is_image_name(info.filename):
+                    _check_size(info.filename, info.file_size, max_member_bytes)
+                    with zf.open(info) as member:
+                        yield info.filename, _bounded_read(member, info.filename, max_member_bytes)
+        return
+    fileobj.seek(0)
+    try:
+        tar = tarfile.open(fileobj=fileobj, mode='r:*')
+    except tarfile.TarError:
+        fileobj.seek(0)
+        yield filename, fileobj.read()
+        return
+    with tar:
+        for member in tar:
+            if member.isfile() and _is_image_name(member.name):
+                _check_size(member.name, member.size, max_member_bytes)
+                yield member.name, _bounded_read(tar.extractfile(member), member.name, max_member_bytes)
+
+
+def limit_images(entries, max_images, max_total_bytes=None):
+    """Passes (name, image_bytes) entries through, raising ValueError past
+    `max_images` entries or `max_total_bytes` bytes in total"""
+    total = 0
+    for i, (name, data) in enumerate(entries):
+        if i >= max_images:
+            raise ValueError(f"At most {max_images} images per request")
+        total += len(data)
+        if max_total_bytes is not None and total > max_total_bytes:
+            raise ValueError(f"At most {max_total_bytes // (1 << 20)} MB of images per request")
+        yield name, data
+
+
+class StudyAggregate:
+    """Running study-level aggregate over per-image results, in constant memory"""
+
+    def __init__(self):
+        self.n_images = 0
+        self.n_scored = 0
+        self.label_counts = {}
+        self.prob_sums = {}
+        self.max_probs = {}
+
+    def add(self, result):
+        self.n_images += 1
+        if result.get("predicted_label") is None:
+            return
+        self.n_scored += 1
+        label = result["predicted_label"]
+        self.label_counts[label] = self.label_counts.get(label, 0) + 1
+        for label, p in result["probabilities"].items():
+            self.prob_sums[label] = self.prob_sums.get(label, 0.0) + p
+            self.max_probs[label] = max(self.max_probs.get(label, 0.0), p)
+
+    def summary(self):
+        mean_probs = {label: total / self.n_scored for label, total in self.prob_sums.items()}
+        return {
+            "n_images": self.n_images,
+            "n_failed": self.n_images - self.n_scored,
+            "label_counts": self.label_counts,
+            "mean_probabilities": mean_probs,
+            "max_probabilities": self.max_probs,
+            "predicted_label": max(mean_probs, key=mean_probs.get) if mean_probs else None,
+        }
+
+
+def summarize_study(results):
+    """Study-level aggregate over per-image (predicted_label, probabilities) results"""
+    aggregate = StudyAggregate()
+    for r in results:
+        aggregate.add(r)
+    return aggregate.summary()
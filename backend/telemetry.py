@@ -0,0 +1,200 @@
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+
+# seconds; spans a cache hit (~100us) to a cold multi-image request
+DEFAULT_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+                   0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _format_labels(names, values):
+    if not names:
+        return ''
+    pairs = ','.join(f'{n}="{_escape(v)}"' for n, v in zip(names, values))
+    return '{' + pairs + '}'
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value))
+
+
+class Counter:
+    def __init__(self, name, help, labelnames=()):
+        self.name, self.help, self.labelnames = name, help, tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels, amount=1.0):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} counter']
+        with self._lock:
+            items = sorted(self._values.items())
+        for labels, value in items:
+            lines.append(f'{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}')
+        return lines
+
+
+class Gauge(Counter):
+    def set(self, value, *labels):
+        with self._lock:
+            self._values[labels] = float(value)
+
+    def dec(self, *labels, amount=1.0):
+        self.inc(*labels, amount=-amount)
+
+    def render(self):
+        lines = super().render()
+        lines[1] = f'# TYPE {self.name} gauge'
+        return lines
+
+
+class Histogram:
+    """Fixed-bucket histogram; observe() is a bisect and three additions under a lock"""
+
+    def __init__(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name, self.help, self.labelnames = name, help, tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labels):
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][i] += 1
+            series[1] += value
+            series[2] += 1
+
+    @contextmanager
+    def time(self, *labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, *labels)
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            items = sorted((labels, (list(s[0]), s[1], s[2])) for labels, s in self._series.items())
+        names = self.labelnames + ('le',)
+        for labels, (counts, total, count) in items:
+            cumulative = 0
+            for bound, n in zip(self.buckets + (float('inf'),), counts):
+                cumulative += n
+                lines.append(f'{self.name}_bucket{_format_labels(names, labels + (_format_value(bound),))} {cumulative}')
+            lines.append(f'{self.name}_sum{_format_labels(self.labelnames, labels)} {_format_value(total)}')
+            lines.append(f'{self.name}_count{_format_labels(self.labelnames, labels)} {count}')
+        return lines
+
+
+class Registry:
+    """Metrics updated on the hot path plus collectors evaluated at scrape time.
+
+    A collector is a callable returning [(name, type, help, [(labels_dict, value)])],
+    for values that already live elsewhere (cache counters, pool sizes).
+    """
+
+    def __init__(self):
+        self._metrics = []
+        self._collectors = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def add_collector(self, collector):
+        self._collectors.append(collector)
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        for collector in self._collectors:
+            try:
+                families = collector()
+            except Exception as e:
+                lines.append(f'# collector {getattr(collector, "__name__", collector)} failed: {e!r}')
+                continue
+            for name, kind, help, samples in families:
+                lines.append(f'# HELP {name} {help}')
+                lines.append(f'# TYPE {name} {kind}')
+                for labels, value in samples:
+                    if value is None:
+                        continue
+                    lines.append(f'{name}{_format_labels(tuple(labels), tuple(labels.values()))} {_format_value(value)}')
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+STAGE_SECONDS = REGISTRY.register(Histogram(
+    'brain_stage_seconds',
+    'Time spent per request-processing stage',
+    ['stage']))
+BATCH_SIZE = REGISTRY.register(Histogram(
+    'brain_model_batch_size',
+    'Images per model forward pass',
+    buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256)))
+REQUESTS = REGISTRY.register(Counter(
+    'brain_http_requests_total',
+    'HTTP requests by route, method and status',
+    ['route', 'method', 'status']))
+REQUEST_SECONDS = REGISTRY.register(Histogram(
+    'brain_http_request_seconds',
+    'HTTP request latency by route (until the response is fully sent)',
+    ['route', 'method']))
+IN_FLIGHT = REGISTRY.register(Gauge(
+    'brain_http_requests_in_flight',
+    'HTTP requests currently being handled'))
+
+
+def observe_stage(stage, seconds):
+    STAGE_SECONDS.observe(seconds, stage)
+
+
+def stage(name):
+    """Context manager timing one stage into brain_stage_seconds"""
+    return STAGE_SECONDS.time(name)
+
+
+class MetricsMiddleware:
+    """ASGI middleware counting requests, in-flight requests and latency per route template"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+        status = [500]
+
+        async def send_wrapper(message):
+            if message['type'] == 'http.response.start':
+                status[0] = message['status']
+            await send(message)
+
+        start = time.perf_counter()
+        IN_FLIGHT.inc()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            IN_FLIGHT.dec()
+            route = scope.get('route')
+            # the template ('/history/{item_id}'), never the raw path, to bound label cardinality
+            template = getattr(route, 'path', None) or 'unmatched'
+            REQUESTS.inc(template, scope['method'], str(status[0]))
+            REQUEST_SECONDS.observe(time.perf_counter() - start, template, scope['method'])
@@ -0,0 +1,300 @@
+import itertools
+import multiprocessing as mp
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+from multiprocessing import shared_memory
+
+import numpy as np
+
+
+def _core_shares(n_workers):
+    """Splits the cores this process may use into n_workers disjoint, near-equal sets"""
+    if hasattr(os, 'sched_getaffinity'):
+        cores = sorted(os.sched_getaffinity(0))
+    else:
+        cores = list(range(os.cpu_count() or 1))
+    if len(cores) < n_workers:
+        return [cores] * n_workers
+    per = len(cores) // n_workers
+    shares = [cores[i * per:(i + 1) * per] for i in range(n_workers)]
+    for i, core in enumerate(cores[n_workers * per:]):
+        shares[i].append(core)
+    return shares
+
+
+def _worker_main(worker_id, backend, cores, intra_threads, shm_names, slot_shape, out_shape, tasks, results):
+    # pin before TensorFlow starts its thread pools so they size to this share
+    if hasattr(os, 'sched_setaffinity'):
+        os.sched_setaffinity(0, cores)
+    threads = str(intra_threads or len(cores))
+    os.environ['OMP_NUM_THREADS'] = threads
+    os.environ['TF_NUM_INTRAOP_THREADS'] = threads
+    os.environ['TF_NUM_INTEROP_THREADS'] = '1'
+    os.environ['INFERENCE_NUM_THREADS'] = threads
+    try:
+        from . import predict as predictor
+        if backend in predictor.KERAS_BACKENDS:
+            import tensorflow as tf
+            tf.config.threading.set_intra_op_parallelism_threads(int(threads))
+            tf.config.threading.set_inter_op_parallelism_threads(1)
+        runner = predictor.build_runner(backend)
+        shm_in = shared_memory.SharedMemory(name=shm_names[0])
+        shm_out = shared_memory.SharedMemory(name=shm_names[1])
+        inputs = np.ndarray(slot_shape, dtype=np.float32, buffer=shm_in.buf)
+        outputs = np.ndarray(out_shape, dtype=np.float32, buffer=shm_out.buf)
+        # warm up so the first real batch does not pay for tracing
+        runner(np.zeros((1,) + slot_shape[2:], dtype=np.float32))
+    except Exception as e:
+        results.put(('failed', worker_id, None, repr(e)))
+        return
+    results.put(('ready', worker_id, None, None))
+
+    while True:
+        task = tasks.get()
+        if task is None:
+            break
+        slot, task_id, n = task
+        try:
+            y = runner(inputs[slot, :n])
+            outputs[slot, :n, :y.shape[1]] = y
+            results.put((slot, task_id, y.shape[1], None))
+        except Exception as e:
+            results.put((slot, task_id, 0, repr(e)))
+    del inputs, outputs
+    shm_in.close()
+    shm_out.close()
+
+
+class _Worker:
+    __slots__ = ('worker_id', 'cores', 'process', 'tasks', 'ready', 'in_flight', 'restarts', 'given_up')
+
+    def __init__(self, worker_id, cores):
+        self.worker_id = worker_id
+        self.cores = cores
+        self.process = None
+        self.tasks = None
+        self.ready = False
+        self.in_flight = set()
+        self.restarts = 0
+        self.given_up = False
+
+
+class WorkerPool:
+    """Runs inference in separate processes, each pinned to its own share of the cores.
+
+    Batches are exchanged through two shared-memory arenas of `slots` fixed-size
+    slots (inputs and outputs); only (slot, task id, n) tuples travel over the
+    queues, so tensors are never pickled. Calling the pool is thread-safe and
+    blocks until the batch has been run; each batch goes to the worker with
+    the fewest batches in flight.
+
+    A worker that dies fails the batches it held and is restarted (up to
+    `max_restarts` times each); a batch not done within `task_timeout` gets
+    its worker killed and restarted. `healthy()` turns false once no worker
+    is usable, and /health reports it.
+    """
+
+    def __init__(self, n_workers, backend, max_batch_size, n_outputs, input_shape,
+                 slots=None, intra_threads=None, start_timeout=300.0, task_timeout=120.0,
+                 max_restarts=3):
+        self.n_workers = max(1, int(n_workers))
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.slots = max(self.n_workers, int(slots or 2 * self.n_workers))
+        self.task_timeout = task_timeout
+        self.max_restarts = max_restarts
+        self._backend = backend
+        self._intra_threads = intra_threads
+        self._slot_shape = (self.slots, self.max_batch_size) + tuple(input_shape)
+        self._out_shape = (self.slots, self.max_batch_size, int(n_outputs))
+        self._shm_in = shared_memory.SharedMemory(
+            create=True, size=int(np.prod(self._slot_shape)) * 4)
+        self._shm_out = shared_memory.SharedMemory(
+            create=True, size=int(np.prod(self._out_shape)) * 4)
+        self._inputs = np.ndarray(self._slot_shape, dtype=np.float32, buffer=self._shm_in.buf)
+        self._outputs = np.ndarray(self._out_shape, dtype=np.float32, buffer=self._shm_out.buf)
+
+        self._ctx = mp.get_context('spawn')
+        self._results = self._ctx.Queue()
+        self._free_slots = queue.Queue()
+        for slot in range(self.slots):
+            self._free_slots.put(slot)
+        self._lock = threading.Lock()
+        self._pending = {}
+        self._task_ids = itertools.count()
+        self._batches_total = 0
+        self._worker_deaths = 0
+        self._closing = False
+
+        self._workers = [_Worker(i, cores) for i, cores in enumerate(_core_shares(self.n_workers))]
+        for worker in self._workers:
+            self._start_worker(worker)
+        try:
+            self._wait_ready(start_timeout)
+        except Exception:
+            self.close()
+            raise
+        self._collector = threading.Thread(target=self._collect, name='inference-pool-results', daemon=True)
+        self._collector.start()
+
+    def _start_worker(self, worker):
+        # a fresh task queue: one a process died reading from may be left locked
+        worker.tasks = self._ctx.Queue()
+        worker.ready = False
+        worker.process = self._ctx.Process(
+            target=_worker_main,
+            args=(worker.worker_id, self._backend, worker.cores, self._intra_threads,
+                  (self._shm_in.name, self._shm_out.name),
+                  self._slot_shape, self._out_shape, worker.tasks, self._results),
+            name=f'inference-worker-{worker.worker_id}',
+            daemon=True,
+        )
+        worker.process.start()
+
+    def _wait_ready(self, timeout):
+        deadline = time.monotonic() + timeout
+        ready = 0
+        while ready < self.n_workers:
+            status, worker_id, _, error = self._results.get(timeout=max(0.0, deadline - time.monotonic()))
+            if status == 'failed':
+                raise RuntimeError(f"Inference worker {worker_id} failed to start: {error}")
+            self._workers[worker_id].ready = True
+            ready += 1
+
+    def _collect(self):
+        while True:
+            try:
+                item = self._results.get(timeout=0.5)
+            except queue.Empty:
+                item = ()
+            if item is None:
+                break
+            if item:
+                self._handle_result(*item)
+            self._check_workers()
+
+    def _handle_result(self, key, ident, value, error):
+        # (slot, task id, width, error), or ('ready' / 'failed', worker id, None, error)
+        if key == 'ready':
+            self._workers[ident].ready = True
+            return
+        if key == 'failed':
+            print(f"Inference worker {ident} failed to restart: {error}")
+            return
+        with self._lock:
+            pending = self._pending.get(key)
+            if pending is None or pending[0] != ident:
+                # the batch was already failed because its worker died or timed
+                # out; the slot may since hold another batch, which this is not for
+                return
+            del self._pending[key]
+            for worker in self._workers:
+                worker.in_flight.discard(key)
+        future = pending[1]
+        if error is not None:
+            future.set_exception(RuntimeError(error))
+        else:
+            future.set_result(value)
+
+    def _check_workers(self):
+        for worker in self._workers:
+            if self._closing or worker.given_up or worker.process.is_alive():
+                continue
+            with self._lock:
+                lost = [self._pending.pop(slot, (None, None))[1] for slot in worker.in_flight]
+                worker.in_flight.clear()
+                worker.ready = False
+            self._worker_deaths += 1
+            code = worker.process.exitcode
+            for future in lost:
+                if future is not None:
+                    future.set_exception(RuntimeError(
+                        f"Inference worker {worker.worker_id} died (exit code {code})"))
+            if worker.restarts >= self.max_restarts:
+                worker.given_up = True
+                print(f"Inference worker {worker.worker_id} died (exit code {code}); "
+                      f"not restarting after {worker.restarts} restarts")
+                continue
+            worker.restarts += 1
+            print(f"Inference worker {worker.worker_id} died (exit code {code}); restarting")
+            self._start_worker(worker)
+
+    def _pick_worker(self):
+        candidates = [w for w in self._workers if w.ready and w.process.is_alive()]
+        if not candidates:
+            raise RuntimeError("No inference worker is available")
+        return min(candidates, key=lambda w: len(w.in_flight))
+
+    def _run_slot(self, x):
+        slot = self._free_slots.get()
+        try:
+            n = x.shape[0]
+            self._inputs[slot, :n] = x
+            future = Future()
+            with self._lock:
+                # under the lock, so a worker found dead by the collector either
+                # has this slot in in_flight or is never handed it
+                worker = self._pick_worker()
+                task_id = next(self._task_ids)
+                self._pending[slot] = (task_id, future)
+                worker.in_flight.add(slot)
+                worker.tasks.put((slot, task_id, n))
+            try:
+                width = future.result(timeout=self.task_timeout)
+            except FutureTimeout:
+                # the worker is hung; killing it lets the collector fail its
+                # other batches and restart it, and makes this slot safe to reuse
+                with self._lock:
+                    self._pending.pop(slot, None)
+                    worker.in_flight.discard(slot)
+                worker.process.kill()
+                worker.process.join(5)
+                raise RuntimeError(f"Inference worker {worker.worker_id} timed out after {self.task_timeout}s")
+            self._batches_total += 1
+            return self._outputs[slot, :n, :width].copy()
+        finally:
+            self._free_slots.put(slot)
+
+    def __call__(self, x):
+        if x.shape[0] <= self.max_batch_size:
+            return self._run_slot(x)
+        parts = [self._run_slot(x[i:i + self.max_batch_size])
+                 for i in range(0, x.shape[0], self.max_batch_size)]
+        return np.concatenate(parts, axis=0)
+
+    def healthy(self):
+        return any(w.ready and w.process.is_alive() for w in self._workers)
+
+    def stats(self):
+        return {
+            "workers": self.n_workers,
+            "alive": sum(w.process.is_alive() for w in self._workers),
+            "ready": sum(w.ready and w.process.is_alive() for w in self._workers),
+            "healthy": self.healthy(),
+            "restarts_total": sum(w.restarts for w in self._workers),
+            "deaths_total": self._worker_deaths,
+            "slots": self.slots,
+            "slots_busy": self.slots - self._free_slots.qsize(),
+            "max_batch_size": self.max_batch_size,
+            "batches_total": self._batches_total,
+        }
+
+    def close(self):
+        self._closing = True
+        for worker in self._workers:
+            if worker.process is not None and worker.process.is_alive():
+                worker.tasks.put(None)
+        for worker in self._workers:
+            if worker.process is None:
+                continue
+            worker.process.join(timeout=10)
+            if worker.process.is_alive():
+                worker.process.terminate()
+        self._results.put(None)
+        self._inputs = self._outputs = None
+        self._shm_in.close()
+        self._shm_in.unlink()
+        self._shm_out.close()
+        self._shm_out.unlink()
@@ -0,0 +1,155 @@
+import collections
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+from . import telemetry
+
+
+class _PendingWrite:
+    __slots__ = ('rows', 'future', 'enqueued_at')
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.future = Future()
+        self.enqueued_at = time.perf_counter()
+
+
+class GroupCommitWriter:
+    """Background writer that commits queued inserts in groups.
+
+    `submit(rows)` takes a list of (table, values) pairs that must be written
+    together and returns a Future resolving once they are committed. Pending
+    writes are collected until `max_rows` rows are queued or the oldest has
+    waited `max_delay_ms`, then inserted with one executemany per table in a
+    single transaction, so concurrent requests share one commit (one fsync)
+    instead of each paying for their own.
+
+    Durability: a resolved Future means the rows are committed with the
+    database's own guarantees (for SQLite see SQLITE_SYNCHRONOUS). Rows whose
+    Future has not resolved are lost if the process dies. If a group fails,
+    its writes are retried one by one so a bad row only fails its own Future.
+    """
+
+    def __init__(self, engine, max_rows=64, max_delay_ms=10.0, stats_window=1024):
+        self._engine = engine
+        self.max_rows = max(1, int(max_rows))
+        self.max_delay = max(0.0, float(max_delay_ms)) / 1000.0
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+        self._stopping = False
+        self._stats_lock = threading.Lock()
+        self._commits_total = 0
+        self._rows_total = 0
+        self._errors_total = 0
+        self._group_rows = collections.deque(maxlen=stats_window)
+        self._commit_ms = collections.deque(maxlen=stats_window)
+
+    def start(self):
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stopping = False
+            self._thread = threading.Thread(target=self._loop, name='db-writer', daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout=10.0):
+        """Commits everything still queued, then stops the thread"""
+        with self._lock:
+            thread = self._thread
+            self._stopping = True
+            self._thread = None
+        if thread is not None:
+            thread.join(timeout)
+
+    def submit(self, rows):
+        if self._thread is None:
+            self.start()
+        write = _PendingWrite(rows)
+        self._queue.put(write)
+        return write.future
+
+    def queue_depth(self):
+        return self._queue.qsize()
+
+    def stats(self):
+        with self._stats_lock:
+            groups = sorted(self._group_rows)
+            commits = sorted(self._commit_ms)
+        return {
+            "queue_depth": self.queue_depth(),
+            "max_rows": self.max_rows,
+            "max_delay_ms": self.max_delay * 1000.0,
+            "commits_total": self._commits_total,
+            "rows_total": self._rows_total,
+            "errors_total": self._errors_total,
+            "rows_per_commit_p50": groups[len(groups) // 2] if groups else None,
+            "commit_ms_p50": commits[len(commits) // 2] if commits else None,
+            "commit_ms_p99": commits[int(0.99 * (len(commits) - 1))] if commits else None,
+        }
+
+    def _collect(self):
+        try:
+            first = self._queue.get(timeout=0.1)
+        except queue.Empty:
+            return []
+        group = [first]
+        n_rows = len(first.rows)
+        deadline = first.enqueued_at + self.max_delay
+        while n_rows < self.max_rows:
+            remaining = deadline - time.perf_counter()
+            try:
+                write = self._queue.get_nowait() if remaining <= 0 else self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            group.append(write)
+            n_rows += len(write.rows)
+        return group
+
+    def _loop(self):
+        while True:
+            group = self._collect()
+            if group:
+                self._commit(group)
+            elif self._stopping:
+                break
+
+    def _insert(self, writes):
+        # one executemany per table, tables in first-seen order so parent
+        # rows go in before the rows referencing them
+        by_table = {}
+        for write in writes:
+            for table, values in write.rows:
+                by_table.setdefault(table, []).append(values)
+        with self._engine.begin() as conn:
+            for table, values in by_table.items():
+                conn.execute(table.insert(), values)
+
+    def _commit(self, group):
+        started = time.perf_counter()
+        try:
+            self._insert(group)
+        except Exception:
+            failed = 0
+            for write in group:
+                try:
+                    self._insert([write])
+                except Exception as e:
+                    failed += 1
+                    write.future.set_exception(e)
+                else:
+                    write.future.set_result(None)
+        else:
+            failed = 0
+            for write in group:
+                write.future.set_result(None)
+        elapsed = time.perf_counter() - started
+        telemetry.observe_stage('db_commit', elapsed)
+        with self._stats_lock:
+            self._commit_ms.append(elapsed * 1000.0)
+            self._group_rows.append(sum(len(w.rows) for w in group))
+            self._commits_total += 1
+            self._rows_total += sum(len(w.rows) for w in group)
+            self._errors_total += failed
@@ -0,0 +1,64 @@
+"""
+Per-call latency of the inference backends in backend/predict.py
+
+Usage (from the repository root):
+    python -m benchmarks.bench_inference --iterations 200 --batch-sizes 1 8 32
+"""
+import argparse
+import json
+import time
+
+import numpy as np
+
+from backend import predict as predictor
+
+
+def _time_runner(runner, batch_size, iterations, warmup):
+    x = np.random.rand(batch_size, *predictor.INPUT_SHAPE).astype('float32')
+    for _ in range(warmup):
+        runner(x)
+    timings = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        runner(x)
+        timings.append((time.perf_counter() - start) * 1000.0)
+    timings.sort()
+    return {
+        "batch_size": batch_size,
+        "mean_ms": sum(timings) / len(timings),
+        "p50_ms": timings[len(timings) // 2],
+        "p99_ms": timings[int(0.99 * (len(timings) - 1))],
+        "images_per_s": batch_size * 1000.0 * len(timings) / sum(timings),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--backends', nargs='+', default=list(predictor.KERAS_BACKENDS))
+    parser.add_argument('--batch-sizes', nargs='+', type=int, default=[1, 8])
+    parser.add_argument('--iterations', type=int, default=100)
+    parser.add_argument('--warmup', type=int, default=5)
+    parser.add_argument('--json', dest='json_path', help='Also write results to this file')
+    args = parser.parse_args()
+
+    model = None
+    if any(b in predictor.KERAS_BACKENDS for b in args.backends):
+        model = predictor.load_keras_model()
+    results = []
+    for backend in args.backends:
+        runner = predictor.build_runner(backend, model)
+        for n in args.batch_sizes:
+            r = _time_runner(runner, n, args.iterations, args.warmup)
+            r["backend"] = backend
+            results.append(r)
+            print(f"{backend:>10}  batch={n:<4} mean={r['mean_ms']:8.2f} ms  "
+                  f"p50={r['p50_ms']:8.2f} ms  p99={r['p99_ms']:8.2f} ms  "
+                  f"{r['images_per_s']:8.1f} img/s")
+
+    if args.json_path:
+        with open(args.json_path, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
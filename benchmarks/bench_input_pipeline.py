@@ -0,0 +1,87 @@
+"""
+Training input throughput: ImageDataGenerator vs input_pipeline.py (tf.data)
+
+Iterates a number of augmented training batches from data/Training with
+each loader and reports images/second. The tf.data numbers are given for
+the first pass (decode), a second pass (served from the uint8 cache) and
+for batches gathered from the dataset_cache.py memmap.
+
+Usage (from the repository root):
+    python -m benchmarks.bench_input_pipeline --batches 50
+"""
+import argparse
+import json
+import time
+
+import dataset_cache
+import input_pipeline
+
+DATA_DIR = 'data/Training'
+
+
+def _generator(batch_size):
+    import tensorflow as tf
+    from tensorflow.keras.preprocessing.image import ImageDataGenerator
+    # the exact augmentation of the former model.py loader, random contrast included
+    datagen = ImageDataGenerator(
+        rescale=1./255,
+        rotation_range=30,
+        width_shift_range=0.2,
+        height_shift_range=0.2,
+        zoom_range=0.2,
+        brightness_range=(0.7, 1.3),
+        shear_range=0.1,
+        horizontal_flip=True,
+        validation_split=0.2,
+        fill_mode='nearest',
+        preprocessing_function=lambda x: tf.image.random_contrast(x, 0.8, 1.2),
+    )
+    return datagen.flow_from_directory(
+        DATA_DIR, target_size=(224, 224), color_mode='grayscale',
+        class_mode='categorical', batch_size=batch_size, subset='training')
+
+
+def _rate(iterator, batches, batch_size):
+    next(iterator)  # exclude start-up (thread pools, tracing)
+    start = time.perf_counter()
+    for _ in range(batches):
+        next(iterator)
+    return batches * batch_size / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--batches', type=int, default=50, help='Batches timed per measurement')
+    parser.add_argument('--batch-size', type=int, default=32)
+    parser.add_argument('--json', dest='json_path', help='Also write results to this file')
+    args = parser.parse_args()
+
+    results = {}
+    results['image_data_generator_img_s'] = _rate(iter(_generator(args.batch_size)), args.batches, args.batch_size)
+    print(f"ImageDataGenerator      {results['image_data_generator_img_s']:8.1f} img/s")
+
+    paths, labels, class_names = input_pipeline.load_split(DATA_DIR, subset='training', validation_split=0.2)
+    ds = input_pipeline.make_dataset(paths, labels, len(class_names), args.batch_size,
+                                     training=True, augment=True)
+    # cold: decode on the fly; warm: a full pass has filled the cache
+    results['tf_data_cold_img_s'] = _rate(iter(ds), args.batches, args.batch_size)
+    print(f"tf.data (first pass)    {results['tf_data_cold_img_s']:8.1f} img/s")
+    for _ in ds:
+        pass
+    results['tf_data_cached_img_s'] = _rate(iter(ds), args.batches, args.batch_size)
+    print(f"tf.data (cached)        {results['tf_data_cached_img_s']:8.1f} img/s")
+
+    images, rows, labels, class_names = dataset_cache.load_cached_split(
+        DATA_DIR, subset='training', validation_split=0.2)
+    ds = input_pipeline.make_array_dataset(images, rows, labels, len(class_names), args.batch_size,
+                                           training=True, augment=True)
+    results['memmap_img_s'] = _rate(iter(ds), args.batches, args.batch_size)
+    print(f"memmap cache            {results['memmap_img_s']:8.1f} img/s")
+
+    if args.json_path:
+        with open(args.json_path, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
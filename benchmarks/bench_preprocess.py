@@ -0,0 +1,80 @@
+"""
+Images/second of upload preprocessing by source resolution and format
+
+Compares the original PIL path (full decode, convert, resize, astype, /255)
+with backend/preprocess.py (JPEG draft decode written into a preallocated
+batch buffer).
+
+Usage (from the repository root):
+    python -m benchmarks.bench_preprocess --sizes 256 512 1024 2048
+"""
+import argparse
+import io
+import json
+import time
+
+import numpy as np
+from PIL import Image
+
+from backend import preprocess
+
+
+def _legacy_preprocess(image_bytes):
+    img = Image.open(io.BytesIO(image_bytes)).convert('L')
+    img = img.resize((224, 224))
+    arr = np.asarray(img).astype('float32') / 255.0
+    return arr.reshape((1, 224, 224, 1))
+
+
+def _synthetic_image(size, fmt):
+    rng = np.random.default_rng(size)
+    # smooth gradient plus noise compresses roughly like a real scan
+    yy, xx = np.mgrid[0:size, 0:size]
+    base = (np.sin(xx / 37.0) + np.cos(yy / 23.0)) * 60 + 128
+    pixels = np.clip(base + rng.normal(0, 12, base.shape), 0, 255).astype('uint8')
+    buf = io.BytesIO()
+    Image.fromarray(pixels, 'L').convert('RGB').save(buf, format=fmt, quality=90)
+    return buf.getvalue()
+
+
+def _rate(fn, seconds):
+    n = 0
+    start = time.perf_counter()
+    while time.perf_counter() - start < seconds:
+        fn()
+        n += 1
+    return n / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', nargs='+', type=int, default=[256, 512, 1024, 2048])
+    parser.add_argument('--formats', nargs='+', default=['JPEG', 'PNG'])
+    parser.add_argument('--batch-size', type=int, default=16)
+    parser.add_argument('--seconds', type=float, default=2.0, help='Time budget per measurement')
+    parser.add_argument('--json', dest='json_path', help='Also write results to this file')
+    args = parser.parse_args()
+
+    results = []
+    for fmt in args.formats:
+        for size in args.sizes:
+            data = _synthetic_image(size, fmt)
+            batch = [data] * args.batch_size
+            buf = np.empty((args.batch_size,) + preprocess.INPUT_SHAPE, dtype=np.float32)
+            legacy = _rate(lambda: _legacy_preprocess(data), args.seconds)
+            single = _rate(lambda: preprocess.preprocess(data), args.seconds)
+            batched = args.batch_size * _rate(lambda: preprocess.preprocess_batch(batch, out=buf), args.seconds)
+            r = {"format": fmt, "size": size, "bytes": len(data),
+                 "legacy_img_s": legacy, "single_img_s": single, "batched_img_s": batched}
+            results.append(r)
+            print(f"{fmt:>5} {size:>5}px  legacy {legacy:8.1f} img/s  "
+                  f"new {single:8.1f} img/s  batched {batched:8.1f} img/s  "
+                  f"({single / legacy:4.1f}x)")
+
+    if args.json_path:
+        with open(args.json_path, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,341 @@
+"""
+Load test of the FastAPI app (backend/main.py), in-process and over uvicorn
+
+Sends /predict uploads drawn from backend/uploads/ plus synthetic scans at
+several resolutions, under
+  - closed-loop load: N clients, each sending its next request as soon as
+    the previous one returns
+  - open-loop load: Poisson arrivals at a fixed rate regardless of
+    completions; latency counts from the scheduled send time, so queueing
+    is not hidden (no coordinated omission)
+and reports throughput, p50/p95/p99 latency, errors (e.g. 503 from
+admission control) and RSS of the serving process per configuration.
+
+By default each upload gets a few random trailing bytes (ignored by the
+decoders) so the prediction cache never answers; --cache-hits sends the
+images unchanged. The app writes to a throwaway database and upload
+directory unless --keep-data is given.
+
+Usage (from the repository root):
+    python -m benchmarks.bench_serving --transport both --concurrency 1 4 16 --rates 10 50
+    python -m benchmarks.bench_serving --json runs/$(git rev-parse --short HEAD).json
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+from benchmarks.bench_preprocess import _synthetic_image
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+UPLOADS_DIR = os.path.join(REPO_ROOT, 'backend', 'uploads')
+IMAGE_EXTENSIONS = {'.png', '.jpg', '.jpeg', '.bmp', '.tif', '.tiff', '.webp'}
+
+
+def rss_mb(pid=None):
+    """Resident set size of a process (default: this one) in MB, from /proc"""
+    try:
+        with open(f"/proc/{pid or 'self'}/status") as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) / 1024.0
+    except OSError:
+        pass
+    return None
+
+
+class RssSampler:
+    """Samples the RSS of a process in the background; reports start, end and peak"""
+
+    def __init__(self, pid=None, interval=0.1):
+        self.pid, self.interval = pid, interval
+        self._samples = []
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.is_set():
+            value = rss_mb(self.pid)
+            if value is not None:
+                self._samples.append(value)
+            self._stop.wait(self.interval)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+    def summary(self):
+        if not self._samples:
+            return {"rss_start_mb": None, "rss_end_mb": None, "rss_peak_mb": None}
+        return {"rss_start_mb": self._samples[0], "rss_end_mb": self._samples[-1],
+                "rss_peak_mb": max(self._samples)}
+
+
+def load_images(sizes, max_samples):
+    """[(name, bytes)]: stored uploads (originals only) plus synthetic JPEG/PNG scans"""
+    images = []
+    for dirpath, _, filenames in os.walk(UPLOADS_DIR):
+        for name in sorted(filenames):
+            stem, ext = os.path.splitext(name)
+            # skip the blob store's derived previews / model inputs
+            if ext.lower() not in IMAGE_EXTENSIONS or stem in ('preview', 'input'):
+                continue
+            with open(os.path.join(dirpath, name), 'rb') as f:
+                images.append((name, f.read()))
+            if len(images) >= max_samples:
+                break
+    for size in sizes:
+        images.append((f"synthetic_{size}.jpg", _synthetic_image(size, 'JPEG')))
+        images.append((f"synthetic_{size}.png", _synthetic_image(size, 'PNG')))
+    return images
+
+
+def _percentile(sorted_values, q):
+    if not sorted_values:
+        return None
+    return sorted_values[min(len(sorted_values) - 1, int(q * (len(sorted_values) - 1) + 0.5))]
+
+
+class LoadRun:
+    def __init__(self, client, images, unique):
+        self.client = client
+        self.images = images
+        self.unique = unique
+        self.latencies = []
+        self.statuses = {}
+
+    async def one_request(self, scheduled_at=None):
+        name, data = random.choice(self.images)
+        if self.unique:
+            data = data + os.urandom(16)
+        start = scheduled_at if scheduled_at is not None else time.perf_counter()
+        try:
+            r = await self.client.post('/predict', files={'file': (name, data, 'application/octet-stream')})
+            status = r.status_code
+        except Exception as e:
+            status = type(e).__name__
+        elapsed = time.perf_counter() - start
+        self.statuses[status] = self.statuses.get(status, 0) + 1
+        if status == 200:
+            self.latencies.append(elapsed)
+
+    async def closed_loop(self, concurrency, duration):
+        deadline = time.perf_counter() + duration
+
+        async def client_loop():
+            while time.perf_counter() < deadline:
+                await self.one_request()
+
+        await asyncio.gather(*(client_loop() for _ in range(concurrency)))
+
+    async def open_loop(self, rate, duration, max_outstanding):
+        start = time.perf_counter()
+        next_at = start
+        tasks = set()
+        while next_at < start + duration:
+            delay = next_at - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            if len(tasks) >= max_outstanding:
+                # the client cannot keep up; count it rather than silently slowing the arrival rate
+                self.statuses['dropped_by_client'] = self.statuses.get('dropped_by_client', 0) + 1
+            else:
+                task = asyncio.ensure_future(self.one_request(scheduled_at=next_at))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+            next_at += random.expovariate(rate)
+        if tasks:
+            await asyncio.gather(*tasks)
+
+    def summary(self, wall_seconds):
+        lat = sorted(self.latencies)
+        ms = lambda v: v * 1000.0 if v is not None else None
+        return {
+            "requests": sum(v for k, v in self.statuses.items() if k != 'dropped_by_client'),
+            "ok": len(lat),
+            "statuses": {str(k): v for k, v in sorted(self.statuses.items(), key=lambda kv: str(kv[0]))},
+            "throughput_rps": len(lat) / wall_seconds if wall_seconds > 0 else None,
+            "mean_ms": ms(sum(lat) / len(lat)) if lat else None,
+            "p50_ms": ms(_percentile(lat, 0.50)),
+            "p95_ms": ms(_percentile(lat, 0.95)),
+            "p99_ms": ms(_percentile(lat, 0.99)),
+            "max_ms": ms(lat[-1]) if lat else None,
+        }
+
+
+async def run_configs(client, images, args, server_pid, transport):
+    results = []
+    configs = [('closed', c) for c in args.concurrency] + [('open', r) for r in args.rates]
+    # warm-up: first requests pay lazy loading / tracing
+    warm = LoadRun(client, images, args.unique)
+    await warm.closed_loop(1, args.warmup)
+    for mode, value in configs:
+        run = LoadRun(client, images, args.unique)
+        with RssSampler(server_pid) as rss:
+            start = time.perf_counter()
+            if mode == 'closed':
+                await run.closed_loop(value, args.duration)
+            else:
+                await run.open_loop(value, args.duration, args.max_outstanding)
+            wall = time.perf_counter() - start
+        r = {"transport": transport, "mode": mode,
+             ("concurrency" if mode == 'closed' else "rate_rps"): value,
+             **run.summary(wall), **rss.summary()}
+        results.append(r)
+        label = f"c={value}" if mode == 'closed' else f"rate={value}/s"
+        fmt = lambda v: f"{v:8.1f}" if v is not None else "     n/a"
+        print(f"{transport:>9} {mode:>6} {label:<11} {fmt(r['throughput_rps'])} req/s  "
+              f"p50 {fmt(r['p50_ms'])} ms  p95 {fmt(r['p95_ms'])} ms  p99 {fmt(r['p99_ms'])} ms  "
+              f"rss {fmt(r['rss_peak_mb'])} MB  {r['statuses']}")
+    return results
+
+
+async def bench_inprocess(images, args):
+    import httpx
+    from backend import main as app_module
+    app = app_module.app
+    await app.router.startup()
+    try:
+        # the startup hook warms the model in the background; wait like a load balancer would
+        def ready():
+            state = app_module.predictor.readiness()
+            return state["ready"] or state["error"] is not None
+
+        await _wait_ready(ready, args.ready_timeout)
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url='http://bench', timeout=args.timeout) as client:
+            return await run_configs(client, images, args, None, 'inprocess')
+    finally:
+        await app.router.shutdown()
+
+
+async def _wait_ready(check, timeout):
+    deadline = time.monotonic() + timeout
+    while not check():
+        if time.monotonic() > deadline:
+            raise TimeoutError("Service did not become ready")
+        await asyncio.sleep(0.2)
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+async def bench_uvicorn(images, args, env):
+    import httpx
+    port = _free_port()
+    server = subprocess.Popen(
+        [sys.executable, '-m', 'uvicorn', 'backend.main:app', '--host', '127.0.0.1', '--port', str(port),
+         '--log-level', 'warning'],
+        cwd=REPO_ROOT, env=env)
+    try:
+        async with httpx.AsyncClient(base_url=f'http://127.0.0.1:{port}', timeout=args.timeout,
+                                     limits=httpx.Limits(max_connections=None)) as client:
+            async def ready():
+                try:
+                    r = await client.get('/health')
+                    return r.status_code == 200 and (r.json().get('status') == 'ok' or r.json().get('error'))
+                except httpx.TransportError:
+                    return False
+
+            deadline = time.monotonic() + args.ready_timeout
+            while not await ready():
+                if server.poll() is not None or time.monotonic() > deadline:
+                    raise RuntimeError("uvicorn did not become ready")
+                await asyncio.sleep(0.2)
+            return await run_configs(client, images, args, server.pid, 'uvicorn')
+    finally:
+        server.terminate()
+        try:
+            server.wait(timeout=15)
+        except subprocess.TimeoutExpired:
+            server.kill()
+
+
+def _git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'], cwd=REPO_ROOT, text=True).strip()
+    except Exception:
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--transport', choices=['inprocess', 'uvicorn', 'both'], default='both')
+    parser.add_argument('--concurrency', nargs='*', type=int, default=[1, 4, 16],
+                        help='Closed-loop client counts')
+    parser.add_argument('--rates', nargs='*', type=float, default=[10.0],
+                        help='Open-loop arrival rates (requests/s)')
+    parser.add_argument('--duration', type=float, default=15.0, help='Seconds per configuration')
+    parser.add_argument('--warmup', type=float, default=3.0, help='Seconds of warm-up traffic before measuring')
+    parser.add_argument('--sizes', nargs='*', type=int, default=[256, 512, 1024],
+                        help='Resolutions of the synthetic images')
+    parser.add_argument('--max-samples', type=int, default=50, help='Max images taken from backend/uploads')
+    parser.add_argument('--max-outstanding', type=int, default=1024,
+                        help='Open loop: cap on requests in flight from the client')
+    parser.add_argument('--cache-hits', dest='unique', action='store_false',
+                        help='Send identical bytes so repeated images hit the prediction cache')
+    parser.add_argument('--keep-data', action='store_true',
+                        help='Use the configured database and upload directory instead of throwaway ones')
+    parser.add_argument('--timeout', type=float, default=60.0)
+    parser.add_argument('--ready-timeout', type=float, default=300.0)
+    parser.add_argument('--json', dest='json_path', help='Also write results to this file')
+    args = parser.parse_args()
+
+    try:
+        import httpx  # noqa: F401
+    except ImportError:
+        sys.exit("bench_serving needs httpx: pip install httpx")
+
+    images = load_images(args.sizes, args.max_samples)
+    print(f"{len(images)} images ({sum(len(d) for _, d in images) / 1e6:.1f} MB)")
+
+    scratch = tempfile.TemporaryDirectory(prefix='bench_serving_')
+    if not args.keep_data:
+        # set before backend.main is imported (in-process) and passed to uvicorn
+        os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(scratch.name, 'bench.db')}"
+        os.environ['UPLOAD_DIR'] = os.path.join(scratch.name, 'uploads')
+    env = dict(os.environ)
+
+    results = []
+    try:
+        # uvicorn first: the in-process run imports the app (and TensorFlow) into this process
+        if args.transport in ('uvicorn', 'both'):
+            results += asyncio.run(bench_uvicorn(images, args, env))
+        if args.transport in ('inprocess', 'both'):
+            results += asyncio.run(bench_inprocess(images, args))
+    finally:
+        scratch.cleanup()
+
+    if args.json_path:
+        report = {
+            "commit": _git_commit(),
+            "timestamp": time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "settings": {k: v for k, v in vars(args).items() if k != 'json_path'},
+            "env": {k: v for k, v in os.environ.items()
+                    if k.startswith(('BATCH_', 'INFERENCE_', 'PREDICT', 'DB_', 'SQLITE_', 'WARMUP_'))},
+            "results": results,
+        }
+        with open(args.json_path, 'w') as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,127 @@
+"""
+Import time and memory of the API process, as a regression check
+
+Each measurement runs in a fresh interpreter (nothing cached in
+sys.modules) and reports wall time, RSS and peak RSS after
+  - baseline:  the bare interpreter
+  - app:       `import backend.main` (what /health, /history and test
+               clients need); TensorFlow must not be loaded here
+  - ready:     app + loading and warming up the model with the configured
+               INFERENCE_BACKEND (only with --with-model)
+and which heavy ML modules ended up imported. The app is pointed at a
+throwaway database and upload directory.
+
+Exits non-zero when a forbidden module is imported by `backend.main`, or
+when the app median exceeds --max-import-s / --max-rss-mb.
+
+Usage (from the repository root):
+    python -m benchmarks.bench_startup --repeats 5
+    INFERENCE_BACKEND=tflite python -m benchmarks.bench_startup --with-model --max-rss-mb 250
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HEAVY_MODULES = ('tensorflow', 'keras', 'tflite_runtime', 'ai_edge_litert', 'onnxruntime', 'torch')
+
+_PROBE = r'''
+import json, sys, time
+start = time.perf_counter()
+stage = sys.argv[1]
+if stage in ('app', 'ready'):
+    import backend.main
+if stage == 'ready':
+    from backend import config, predict
+    predict.warmup(config.WARMUP_BATCH_SIZES, config.WARMUP_ITERATIONS)
+elapsed = time.perf_counter() - start
+status = {}
+with open('/proc/self/status') as f:
+    for line in f:
+        key, _, value = line.partition(':')
+        if key in ('VmRSS', 'VmHWM'):
+            status[key] = int(value.split()[0]) / 1024.0
+print(json.dumps({
+    "seconds": elapsed,
+    "rss_mb": status.get('VmRSS'),
+    "peak_rss_mb": status.get('VmHWM'),
+    "modules": len(sys.modules),
+    "heavy_modules": sorted(m for m in %r if m in sys.modules),
+}))
+''' % (HEAVY_MODULES,)
+
+
+def _probe(stage, env):
+    out = subprocess.run([sys.executable, '-c', _PROBE, stage], cwd=REPO_ROOT, env=env,
+                         capture_output=True, text=True)
+    if out.returncode != 0:
+        raise RuntimeError(f"{stage} probe failed:\n{out.stderr}")
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def _median(runs, key):
+    values = [r[key] for r in runs if r[key] is not None]
+    return statistics.median(values) if values else None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repeats', type=int, default=3)
+    parser.add_argument('--with-model', action='store_true', help='Also measure model load and warm-up')
+    parser.add_argument('--forbid', nargs='*', default=['tensorflow', 'keras'],
+                        help='Modules `import backend.main` must not load')
+    parser.add_argument('--max-import-s', type=float, help='Fail if the app import median is slower')
+    parser.add_argument('--max-rss-mb', type=float, help='Fail if the app RSS median is larger')
+    parser.add_argument('--json', dest='json_path', help='Also write results to this file')
+    args = parser.parse_args()
+
+    scratch = tempfile.TemporaryDirectory(prefix='bench_startup_')
+    env = dict(os.environ,
+               DATABASE_URL=f"sqlite:///{os.path.join(scratch.name, 'bench.db')}",
+               UPLOAD_DIR=os.path.join(scratch.name, 'uploads'),
+               PROFILE_DIR=os.path.join(scratch.name, 'profiles'))
+
+    stages = ['baseline', 'app'] + (['ready'] if args.with_model else [])
+    results = {}
+    try:
+        for stage in stages:
+            runs = [_probe(stage, env) for _ in range(args.repeats)]
+            results[stage] = {
+                "seconds": _median(runs, 'seconds'),
+                "rss_mb": _median(runs, 'rss_mb'),
+                "peak_rss_mb": _median(runs, 'peak_rss_mb'),
+                "modules": runs[-1]['modules'],
+                "heavy_modules": runs[-1]['heavy_modules'],
+            }
+            r = results[stage]
+            print(f"{stage:>8}: {r['seconds'] * 1000:8.1f} ms  rss {r['rss_mb']:7.1f} MB  "
+                  f"peak {r['peak_rss_mb']:7.1f} MB  {r['modules']:5d} modules  "
+                  f"heavy: {', '.join(r['heavy_modules']) or '-'}")
+    finally:
+        scratch.cleanup()
+
+    failures = []
+    app = results['app']
+    leaked = sorted(set(app['heavy_modules']) & set(args.forbid))
+    if leaked:
+        failures.append(f"`import backend.main` loaded {', '.join(leaked)}")
+    if args.max_import_s is not None and app['seconds'] > args.max_import_s:
+        failures.append(f"app import took {app['seconds']:.2f}s > {args.max_import_s:.2f}s")
+    if args.max_rss_mb is not None and app['rss_mb'] > args.max_rss_mb:
+        failures.append(f"app RSS {app['rss_mb']:.0f} MB > {args.max_rss_mb:.0f} MB")
+
+    if args.json_path:
+        with open(args.json_path, 'w') as f:
+            json.dump({"results": results, "failures": failures}, f, indent=2)
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
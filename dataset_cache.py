@@ -0,0 +1,182 @@
+"""
+Preprocessed dataset cache for data/Training and data/Testing
+
+Decodes every image once to the model's 224x224 grayscale uint8 input and
+stores the split as a memory-mappable .npy array next to a manifest listing
+each source file with its sha256. Training and evaluation then read batches
+straight from the map (see input_pipeline.make_array_dataset) with no JPEG
+decode at all.
+
+Rebuilds are incremental: files whose size and mtime are unchanged keep
+their hash, rows whose content hash is already in the cache are copied over
+(renames included), and only new or modified images are decoded.
+
+Usage:
+    python dataset_cache.py            # build / update both splits
+    python dataset_cache.py --rebuild  # decode everything again
+"""
+import argparse
+import hashlib
+import json
+import os
+import time
+
+import numpy as np
+
+import input_pipeline
+
+CACHE_DIR = os.environ.get("DATASET_CACHE_DIR", os.path.join("data", "cache"))
+SPLITS = ["data/Training", "data/Testing"]
+MANIFEST_VERSION = 1
+DECODE_BATCH = 64
+COPY_CHUNK = 256
+
+
+def _sha256_file(path):
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def cache_paths(root, cache_dir=None):
+    split_dir = os.path.join(cache_dir or CACHE_DIR, os.path.basename(os.path.normpath(root)))
+    return (os.path.join(split_dir, "images.npy"),
+            os.path.join(split_dir, "manifest.json"))
+
+
+def _load_manifest(path):
+    try:
+        with open(path) as f:
+            manifest = json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+    if manifest.get("version") != MANIFEST_VERSION or manifest.get("img_size") != list(input_pipeline.IMG_SIZE):
+        return None
+    return manifest
+
+
+def _decode_into(out, paths, targets):
+    """Decodes paths with the tf.data decoder (same pixels as make_dataset) into out[targets]"""
+    import tensorflow as tf
+    ds = (tf.data.Dataset.from_tensor_slices(paths)
+          .map(input_pipeline.decode_image, num_parallel_calls=input_pipeline.AUTOTUNE, deterministic=True)
+          .batch(DECODE_BATCH)
+          .prefetch(input_pipeline.AUTOTUNE))
+    offset = 0
+    for batch in ds:
+        n = batch.shape[0]
+        out[targets[offset:offset + n]] = batch.numpy()
+        offset += n
+
+
+def build_cache(root, class_names=None, cache_dir=None, rebuild=False):
+    """Brings the cache for `root` up to date; returns its manifest.
+
+    The manifest's "entries" list holds, per image row, the source path
+    (relative to root), label, sha256, size and mtime.
+    """
+    images_path, manifest_path = cache_paths(root, cache_dir)
+    paths, labels, class_names = input_pipeline.load_split(root, class_names=class_names)
+    old = None if rebuild else _load_manifest(manifest_path)
+    if old is not None and not os.path.exists(images_path):
+        old = None
+    old_by_path = {e["path"]: (row, e) for row, e in enumerate(old["entries"])} if old else {}
+    old_row_by_hash = {e["sha256"]: row for row, e in enumerate(old["entries"])} if old else {}
+
+    entries, sources, hashed = [], [], 0
+    for path, label in zip(paths, labels):
+        rel = os.path.relpath(path, root)
+        st = os.stat(path)
+        previous = old_by_path.get(rel)
+        if previous is not None and (previous[1]["size"], previous[1]["mtime_ns"]) == (st.st_size, st.st_mtime_ns):
+            sha = previous[1]["sha256"]
+        else:
+            sha = _sha256_file(path)
+            hashed += 1
+        entries.append({"path": rel, "label": int(label), "sha256": sha,
+                        "size": st.st_size, "mtime_ns": st.st_mtime_ns})
+        # same path, same content: keep its row. Looking duplicates up by hash
+        # alone would map them all to one row and force a full rewrite every run
+        if previous is not None and previous[1]["sha256"] == sha:
+            sources.append(previous[0])
+        else:
+            sources.append(old_row_by_hash.get(sha))
+
+    manifest = {
+        "version": MANIFEST_VERSION,
+        "img_size": list(input_pipeline.IMG_SIZE),
+        "class_names": class_names,
+        "dataset_sha256": hashlib.sha256(
+            json.dumps([(e["path"], e["label"], e["sha256"]) for e in entries]).encode('utf-8')).hexdigest(),
+        "entries": entries,
+    }
+    os.makedirs(os.path.dirname(images_path), exist_ok=True)
+
+    unchanged = old is not None and sources == list(range(len(old["entries"])))
+    if not unchanged:
+        started = time.perf_counter()
+        reused = [(row, src) for row, src in enumerate(sources) if src is not None]
+        missing = [row for row, src in enumerate(sources) if src is None]
+        tmp_path = images_path + ".tmp.npy"
+        out = np.lib.format.open_memmap(
+            tmp_path, mode='w+', dtype=np.uint8, shape=(len(entries),) + input_pipeline.IMG_SIZE + (1,))
+        if reused:
+            previous_images = np.load(images_path, mmap_mode='r')
+            for i in range(0, len(reused), COPY_CHUNK):
+                chunk = reused[i:i + COPY_CHUNK]
+                out[[row for row, _ in chunk]] = previous_images[[src for _, src in chunk]]
+            del previous_images
+        if missing:
+            _decode_into(out, [paths[row] for row in missing], np.asarray(missing))
+        out.flush()
+        del out
+        os.replace(tmp_path, images_path)
+        print(f"✅ {root}: {len(entries)} images cached ({len(missing)} decoded, {len(reused)} reused) "
+              f"in {time.perf_counter() - started:.1f}s")
+    elif hashed:
+        print(f"✅ {root}: cache up to date ({hashed} touched files re-hashed)")
+
+    if old != manifest:
+        tmp_manifest = manifest_path + ".tmp"
+        with open(tmp_manifest, 'w') as f:
+            json.dump(manifest, f)
+        os.replace(tmp_manifest, manifest_path)
+    return manifest
+
+
+def load_cached_split(root, subset=None, validation_split=0.0, class_names=None, cache_dir=None, update=True):
+    """Like input_pipeline.load_split, but backed by the cache.
+
+    Returns (images memmap, rows, labels, class_names) for
+    input_pipeline.make_array_dataset; the cache is updated first if files
+    were added or changed. With update=False the existing cache is used as
+    is (several training workers reading one cache must not rebuild it).
+    """
+    if update:
+        manifest = build_cache(root, class_names, cache_dir)
+    else:
+        manifest = _load_manifest(cache_paths(root, cache_dir)[1])
+        if manifest is None:
+            raise FileNotFoundError(f"No dataset cache for {root}; run `python dataset_cache.py` first")
+    row_of = {e["path"]: row for row, e in enumerate(manifest["entries"])}
+    paths, labels, class_names = input_pipeline.load_split(root, subset, validation_split, manifest["class_names"])
+    rels = [os.path.relpath(p, root) for p in paths]
+    missing = [rel for rel in rels if rel not in row_of]
+    if missing:
+        raise RuntimeError(f"Dataset cache for {root} is stale: {len(missing)} files (e.g. {missing[0]}) "
+                           f"were added since it was built; run `python dataset_cache.py`")
+    rows = np.array([row_of[rel] for rel in rels], dtype=np.int64)
+    images = np.load(cache_paths(root, cache_dir)[0], mmap_mode='r')
+    return images, rows, labels, class_names
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("splits", nargs="*", default=SPLITS, help="Dataset directories (default: %(default)s)")
+    parser.add_argument("--cache-dir", default=CACHE_DIR)
+    parser.add_argument("--rebuild", action="store_true", help="Ignore the existing cache and decode everything")
+    args = parser.parse_args()
+    for split in args.splits:
+        build_cache(split, cache_dir=args.cache_dir, rebuild=args.rebuild)
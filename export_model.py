@@ -0,0 +1,173 @@
+"""
+Export artifacts/brain_model.h5 to optimized CPU serving formats
+
+Writes, next to the Keras model:
+  - brain_model_dynamic.tflite  (dynamic-range quantization: int8 weights, float activations)
+  - brain_model_int8.tflite     (full int8 post-training quantization, float input/output)
+  - brain_model.onnx            (with --onnx, requires tf2onnx)
+and checks every export against the Keras model on data/Testing, saving the
+results to artifacts/export_metrics.json.
+
+Serve an export with INFERENCE_BACKEND=tflite (TFLITE_MODEL_PATH=... to pick the
+int8 file) or INFERENCE_BACKEND=onnx.
+"""
+import argparse
+import json
+import os
+import time
+
+import numpy as np
+import tensorflow as tf
+from sklearn.metrics import f1_score
+
+from backend import predict as predictor
+from backend.preprocess import INPUT_SHAPE, preprocess_batch
+from backend.studies import IMAGE_EXTENSIONS
+
+ARTIFACTS_DIR = predictor.ARTIFACTS_DIR
+DYNAMIC_PATH = os.path.join(ARTIFACTS_DIR, "brain_model_dynamic.tflite")
+INT8_PATH = os.path.join(ARTIFACTS_DIR, "brain_model_int8.tflite")
+ONNX_PATH = predictor.ONNX_MODEL_PATH
+EXPORT_METRICS_PATH = os.path.join(ARTIFACTS_DIR, "export_metrics.json")
+
+
+def list_images(root, class_indices):
+    """[(path, label_index)] for every image under root/<class>/, in a stable order"""
+    out = []
+    for class_name, index in sorted(class_indices.items(), key=lambda kv: kv[1]):
+        class_dir = os.path.join(root, class_name)
+        for name in sorted(os.listdir(class_dir)):
+            if os.path.splitext(name)[1].lower() in IMAGE_EXTENSIONS:
+                out.append((os.path.join(class_dir, name), index))
+    return out
+
+
+def load_batch(paths):
+    images = []
+    for path in paths:
+        with open(path, 'rb') as f:
+            images.append(f.read())
+    return preprocess_batch(images)
+
+
+def _serving_function(model):
+    fn = tf.function(
+        lambda x: model(x, training=False),
+        input_signature=[tf.TensorSpec((None,) + INPUT_SHAPE, tf.float32)],
+    )
+    return fn, fn.get_concrete_function()
+
+
+def export_tflite(model, path, calibration_paths=None):
+    _, concrete = _serving_function(model)
+    converter = tf.lite.TFLiteConverter.from_concrete_functions([concrete], model)
+    converter.optimizations = [tf.lite.Optimize.DEFAULT]
+    if calibration_paths:
+        def representative_dataset():
+            for p in calibration_paths:
+                yield [load_batch([p])]
+        converter.representative_dataset = representative_dataset
+        converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+    with open(path, 'wb') as f:
+        f.write(converter.convert())
+    print(f"✅ Saved {path} ({os.path.getsize(path) / 1e6:.1f} MB)")
+
+
+def export_onnx(model, path, opset):
+    import tf2onnx
+    fn, _ = _serving_function(model)
+    tf2onnx.convert.from_function(
+        fn, input_signature=[tf.TensorSpec((None,) + INPUT_SHAPE, tf.float32, name='input')],
+        opset=opset, output_path=path,
+    )
+    print(f"✅ Saved {path} ({os.path.getsize(path) / 1e6:.1f} MB)")
+
+
+def evaluate(runner, test_items, batch_size):
+    """Returns (probabilities, mean single-image latency in ms)"""
+    probs = []
+    for start in range(0, len(test_items), batch_size):
+        x = load_batch([p for p, _ in test_items[start:start + batch_size]])
+        probs.append(runner(x))
+    sample = load_batch([test_items[0][0]])
+    runner(sample)
+    timings = []
+    for _ in range(50):
+        t = time.perf_counter()
+        runner(sample)
+        timings.append(time.perf_counter() - t)
+    return np.concatenate(probs, axis=0), 1000.0 * float(np.mean(timings))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--test-dir', default='data/Testing')
+    parser.add_argument('--calibration-dir', default='data/Training')
+    parser.add_argument('--calibration-samples', type=int, default=200)
+    parser.add_argument('--batch-size', type=int, default=32)
+    parser.add_argument('--onnx', action='store_true', help='Also export ONNX (requires tf2onnx)')
+    parser.add_argument('--opset', type=int, default=13)
+    args = parser.parse_args()
+
+    if not os.path.exists(predictor.MODEL_PATH):
+        print(f"❌ Error: Model file not found at {predictor.MODEL_PATH}")
+        exit(1)
+    with open(predictor.CLASS_INDICES_PATH) as f:
+        class_indices = json.load(f)
+
+    print("Loading model...")
+    model = predictor.load_keras_model()
+
+    calibration = list_images(args.calibration_dir, class_indices)
+    step = max(1, len(calibration) // max(1, args.calibration_samples))
+    calibration_paths = [p for p, _ in calibration[::step]][:args.calibration_samples]
+
+    print("\nExporting TFLite (dynamic range)...")
+    export_tflite(model, DYNAMIC_PATH)
+    print(f"\nExporting TFLite (int8, {len(calibration_paths)} calibration images)...")
+    export_tflite(model, INT8_PATH, calibration_paths)
+    exports = {"keras": predictor.MODEL_PATH, "tflite_dynamic": DYNAMIC_PATH, "tflite_int8": INT8_PATH}
+    if args.onnx:
+        print("\nExporting ONNX...")
+        export_onnx(model, ONNX_PATH, args.opset)
+        exports["onnx"] = ONNX_PATH
+
+    test_items = list_images(args.test_dir, class_indices)
+    y_true = np.array([label for _, label in test_items])
+    print(f"\nEvaluating on {len(test_items)} test images...")
+    reference = None
+    metrics = {}
+    for name, path in exports.items():
+        if name == "keras":
+            runner = predictor.build_runner('function', model)
+        elif name == "onnx":
+            from backend.runtimes import OnnxRunner
+            runner = OnnxRunner(path)
+        else:
+            from backend.runtimes import TFLiteRunner
+            runner = TFLiteRunner(path)
+        probs, latency_ms = evaluate(runner, test_items, args.batch_size)
+        y_pred = probs.argmax(axis=1)
+        if reference is None:
+            reference = probs
+        metrics[name] = {
+            "path": os.path.basename(path),
+            "size_bytes": os.path.getsize(path),
+            "accuracy": float((y_pred == y_true).mean()),
+            "f1_weighted": float(f1_score(y_true, y_pred, average='weighted')),
+            "agreement_with_keras": float((y_pred == reference.argmax(axis=1)).mean()),
+            "max_abs_prob_diff": float(np.abs(probs - reference).max()),
+            "latency_ms_batch1": latency_ms,
+        }
+        m = metrics[name]
+        print(f"  {name:>15}: acc {m['accuracy']:.4f}  f1 {m['f1_weighted']:.4f}  "
+              f"agree {m['agreement_with_keras']:.4f}  {m['latency_ms_batch1']:.2f} ms/img  "
+              f"{m['size_bytes'] / 1e6:.1f} MB")
+
+    with open(EXPORT_METRICS_PATH, 'w') as f:
+        json.dump({"n_test_images": len(test_items), "exports": metrics}, f, indent=2)
+    print(f"\n✅ Saved export metrics to {EXPORT_METRICS_PATH}")
+
+
+if __name__ == '__main__':
+    main()
@@ -3,12 +3,14 @@
 import React, { useState, useEffect } from 'react'
 import axios from 'axios'
 import NavBar from '../../components/NavBar'
-import { HistoryItem, HistoryDetails } from '../../types'
+import { HistoryItem, HistoryDetails, HistoryPage as HistoryPageData } from '../../types'
 
 const API = process.env.NEXT_PUBLIC_API_URL || 'http://localhost:8000'
 
 export default function HistoryPage() {
   const [history, setHistory] = useState<HistoryItem[]>([])
+  const [nextCursor, setNextCursor] = useState<string | null>(null)
+  const [loadingMore, setLoadingMore] = useState<boolean>(false)
   const [selected, setSelected] = useState<HistoryItem | null>(null)
   const [details, setDetails] = useState<HistoryDetails | null>(null)
   const [loading, setLoading] = useState<boolean>(true)
@@ -20,8 +22,9 @@ export default function HistoryPage() {
 
   const fetchHistory = async (): Promise<void> => {
     try {
-      const r = await axios.get<HistoryItem[]>(`${API}/history`)
-      setHistory(r.data)
+      const r = await axios.get<HistoryPageData>(`${API}/history`)
+      setHistory(r.data.items)
+      setNextCursor(r.data.next_cursor)
       setLoading(false)
     } catch (e) {
       console.error(e)
@@ -29,6 +32,19 @@ export default function HistoryPage() {
     }
   }
 
+  const loadMore = async (): Promise<void> => {
+    if (!nextCursor) return
+    setLoadingMore(true)
+    try {
+      const r = await axios.get<HistoryPageData>(`${API}/history`, { params: { cursor: nextCursor } })
+      setHistory((prev) => [...prev, ...r.data.items])
+      setNextCursor(r.data.next_cursor)
+    } catch (e) {
+      console.error(e)
+    }
+    setLoadingMore(false)
+  }
+
   const selectItem = async (item: HistoryItem): Promise<void> => {
     setSelected(item)
     setDetailsLoading(true)
@@ -129,6 +145,15 @@ export default function HistoryPage() {
                         </div>
                       </button>
                     ))}
+                    {nextCursor && (
+                      <button
+                        onClick={loadMore}
+                        disabled={loadingMore}
+                        className="w-full py-3 rounded-xl border-2 border-slate-200 text-slate-600 hover:bg-slate-50 transition disabled:opacity-50"
+                      >
+                        {loadingMore ? 'Loading...' : 'Load more'}
+                      </button>
+                    )}
                   </div>
                 )}
               </div>
@@ -167,13 +192,23 @@ export default function HistoryPage() {
                     {/* Image */}
                     <div>
                       <h3 className="text-2xl font-semibold text-slate-800 mb-6">Uploaded Scan</h3>
-                      {details.image_base64 && (
+                      {details.image_url && (
                         <img
-                          src={`data:image/png;base64,${details.image_base64}`}
+                          src={`${API}${details.image_url}`}
                           alt="Scan"
                           className="w-full rounded-xl shadow-2xl border-2 border-slate-200"
                         />
                       )}
+                      {details.original_url && (
+                        <a
+                          href={`${API}${details.original_url}`}
+                          target="_blank"
+                          rel="noreferrer"
+                          className="inline-block mt-4 text-cyan-700 hover:underline"
+                        >
+                          Open original
+                        </a>
+                      )}
                     </div>
 
                     {/* Prediction */}
@@ -167,7 +167,7 @@ export default function StatisticsPage() {
             </div>
 
             {/* Performance Summary Dashboard */}
-            {metrics.performance_summary_base64 && (
+            {metrics.performance_summary_url && (
               <div className="bg-white p-8 rounded-lg shadow-lg">
                 <h2 className="text-2xl font-bold text-slate-800 mb-6 flex items-center">
                   <span className="text-3xl mr-3"></span>
@@ -175,7 +175,7 @@ export default function StatisticsPage() {
                 </h2>
                 <div className="border-2 border-slate-200 rounded-lg overflow-hidden">
                   <img
-                    src={`data:image/png;base64,${metrics.performance_summary_base64}`}
+                    src={`${API}${metrics.performance_summary_url}`}
                     alt="Performance Summary"
                     className="w-full h-auto"
                     style={{maxWidth: '100%'}}
@@ -192,12 +192,12 @@ export default function StatisticsPage() {
         {/* Performance Tab */}
         {activeTab === 'performance' && (
           <div className="space-y-8">
-            {metrics.per_class_performance_base64 && (
+            {metrics.per_class_performance_url && (
               <div className="bg-white p-8 rounded-lg shadow-lg">
                 <h2 className="text-2xl font-bold text-slate-800 mb-6"> Per-Class Performance Metrics</h2>
                 <div className="flex justify-center">
                   <img
-                    src={`data:image/png;base64,${metrics.per_class_performance_base64}`}
+                    src={`${API}${metrics.per_class_performance_url}`}
                     alt="Per-Class Performance"
                     className="w-full max-w-5xl h-auto"
                   />
@@ -263,12 +263,12 @@ export default function StatisticsPage() {
         {activeTab === 'confusion' && (
           <div className="space-y-8">
             <div className="grid grid-cols-1 lg:grid-cols-2 gap-8">
-              {metrics.confusion_matrix_base64 && (
+              {metrics.confusion_matrix_url && (
                 <div className="bg-white p-8 rounded-lg shadow-lg">
                   <h2 className="text-xl font-bold text-slate-800 mb-6">🔢 Confusion Matrix (Counts)</h2>
                   <div className="flex justify-center">
                     <img
-                      src={`data:image/png;base64,${metrics.confusion_matrix_base64}`}
+                      src={`${API}${metrics.confusion_matrix_url}`}
                       alt="Confusion Matrix"
                       className="w-full max-w-2xl h-auto"
                     />
@@ -278,12 +278,12 @@ export default function StatisticsPage() {
                   </p>
                 </div>
               )}
-              {metrics.confusion_matrix_normalized_base64 && (
+              {metrics.confusion_matrix_normalized_url && (
                 <div className="bg-white p-8 rounded-lg shadow-lg">
                   <h2 className="text-xl font-bold text-slate-800 mb-6"> Confusion Matrix (Normalized)</h2>
                   <div className="flex justify-center">
                     <img
-                      src={`data:image/png;base64,${metrics.confusion_matrix_normalized_base64}`}
+                      src={`${API}${metrics.confusion_matrix_normalized_url}`}
                       alt="Normalized Confusion Matrix"
                       className="w-full max-w-2xl h-auto"
                     />
@@ -301,12 +301,12 @@ export default function StatisticsPage() {
         {activeTab === 'curves' && (
           <div className="space-y-8">
             <div className="grid grid-cols-1 lg:grid-cols-2 gap-8">
-              {metrics.roc_curves_base64 && (
+              {metrics.roc_curves_url && (
                 <div className="bg-white p-8 rounded-lg shadow-lg">
                   <h2 className="text-xl font-bold text-slate-800 mb-6"> ROC Curves (One-vs-Rest)</h2>
                   <div className="flex justify-center">
                     <img
-                      src={`data:image/png;base64,${metrics.roc_curves_base64}`}
+                      src={`${API}${metrics.roc_curves_url}`}
                       alt="ROC Curves"
                       className="w-full max-w-3xl h-auto"
                     />
@@ -317,12 +317,12 @@ export default function StatisticsPage() {
                   </p>
                 </div>
               )}
-              {metrics.precision_recall_curves_base64 && (
+              {metrics.precision_recall_curves_url && (
                 <div className="bg-white p-8 rounded-lg shadow-lg">
                   <h2 className="text-xl font-bold text-slate-800 mb-6"> Precision-Recall Curves</h2>
                   <div className="flex justify-center">
                     <img
-                      src={`data:image/png;base64,${metrics.precision_recall_curves_base64}`}
+                      src={`${API}${metrics.precision_recall_curves_url}`}
                       alt="Precision-Recall Curves"
                       className="w-full max-w-3xl h-auto"
                     />
@@ -340,12 +340,12 @@ export default function StatisticsPage() {
         {/* Distribution Tab */}
         {activeTab === 'distribution' && (
           <div className="space-y-8">
-            {metrics.class_distribution_base64 && (
+            {metrics.class_distribution_url && (
               <div className="bg-white p-8 rounded-lg shadow-lg">
                 <h2 className="text-2xl font-bold text-slate-800 mb-6"> Test Set Class Distribution</h2>
                 <div className="flex justify-center">
                   <img
-                    src={`data:image/png;base64,${metrics.class_distribution_base64}`}
+                    src={`${API}${metrics.class_distribution_url}`}
                     alt="Class Distribution"
                     className="w-full max-w-5xl h-auto"
                   />
@@ -3,6 +3,8 @@
 import React from 'react'
 import { Metrics } from '../types'
 
+const API = process.env.NEXT_PUBLIC_API_URL || 'http://localhost:8000'
+
 interface MetricsDashboardProps {
   metrics: Metrics | null
 }
@@ -44,57 +46,57 @@ export default function MetricsDashboard({ metrics }: MetricsDashboardProps) {
       </div>
 
       {/* Performance Summary Dashboard */}
-      {metrics.performance_summary_base64 && (
+      {metrics.performance_summary_url && (
         <div className="bg-white p-4 rounded shadow">
           <h4 className="font-semibold text-lg mb-3">📊 Complete Performance Summary</h4>
-          <img src={`data:image/png;base64,${metrics.performance_summary_base64}`} alt="Performance Summary" className="w-full" />
+          <img src={`${API}${metrics.performance_summary_url}`} alt="Performance Summary" className="w-full" />
         </div>
       )}
 
       {/* Confusion Matrices Side by Side */}
       <div className="grid grid-cols-1 md:grid-cols-2 gap-4">
-        {metrics.confusion_matrix_base64 && (
+        {metrics.confusion_matrix_url && (
           <div className="bg-white p-4 rounded shadow">
             <h5 className="font-semibold mb-3">Confusion Matrix (Counts)</h5>
-            <img src={`data:image/png;base64,${metrics.confusion_matrix_base64}`} alt="Confusion Matrix" className="w-full" />
+            <img src={`${API}${metrics.confusion_matrix_url}`} alt="Confusion Matrix" className="w-full" />
           </div>
         )}
-        {metrics.confusion_matrix_normalized_base64 && (
+        {metrics.confusion_matrix_normalized_url && (
           <div className="bg-white p-4 rounded shadow">
             <h5 className="font-semibold mb-3">Confusion Matrix (Normalized %)</h5>
-            <img src={`data:image/png;base64,${metrics.confusion_matrix_normalized_base64}`} alt="Normalized CM" className="w-full" />
+            <img src={`${API}${metrics.confusion_matrix_normalized_url}`} alt="Normalized CM" className="w-full" />
           </div>
         )}
       </div>
 
       {/* ROC and PR Curves */}
       <div className="grid grid-cols-1 md:grid-cols-2 gap-4">
-        {metrics.roc_curves_base64 && (
+        {metrics.roc_curves_url && (
           <div className="bg-white p-4 rounded shadow">
             <h5 className="font-semibold mb-3">ROC Curves (One-vs-Rest)</h5>
-            <img src={`data:image/png;base64,${metrics.roc_curves_base64}`} alt="ROC Curves" className="w-full" />
+            <img src={`${API}${metrics.roc_curves_url}`} alt="ROC Curves" className="w-full" />
           </div>
         )}
-        {metrics.precision_recall_curves_base64 && (
+        {metrics.precision_recall_curves_url && (
           <div className="bg-white p-4 rounded shadow">
             <h5 className="font-semibold mb-3">Precision-Recall Curves</h5>
-            <img src={`data:image/png;base64,${metrics.precision_recall_curves_base64}`} alt="PR Curves" className="w-full" />
+            <img src={`${API}${metrics.precision_recall_curves_url}`} alt="PR Curves" className="w-full" />
           </div>
         )}
       </div>
 
       {/* Per-Class Performance and Distribution */}
       <div className="grid grid-cols-1 md:grid-cols-2 gap-4">
-        {metrics.per_class_performance_base64 && (
+        {metrics.per_class_performance_url && (
           <div className="bg-white p-4 rounded shadow">
             <h5 className="font-semibold mb-3">Per-Class Performance</h5>
-            <img src={`data:image/png;base64,${metrics.per_class_performance_base64}`} alt="Per-Class Performance" className="w-full" />
+            <img src={`${API}${metrics.per_class_performance_url}`} alt="Per-Class Performance" className="w-full" />
           </div>
         )}
-        {metrics.class_distribution_base64 && (
+        {metrics.class_distribution_url && (
           <div className="bg-white p-4 rounded shadow">
             <h5 className="font-semibold mb-3">Class Distribution</h5>
-            <img src={`data:image/png;base64,${metrics.class_distribution_base64}`} alt="Class Distribution" className="w-full" />
+            <img src={`${API}${metrics.class_distribution_url}`} alt="Class Distribution" className="w-full" />
           </div>
         )}
       </div>
@@ -27,7 +27,7 @@ export default function ResultCard({ selected, apiUrl }: ResultCardProps) {
       <h4 className="font-semibold">Prediction Details</h4>
       {details? (
         <div className="mt-3">
-          {details.image_base64 && <img src={`data:image/png;base64,${details.image_base64}`} className="max-h-60 object-contain" />}
+          {details.image_url && <img src={`${apiUrl}${details.image_url}`} className="max-h-60 object-contain" />}
           <div className="mt-2 text-2xl font-bold">{details.predicted_label}</div>
           <div className="mt-2">
             {Object.entries(details.probabilities).map(([k,v])=> (
@@ -18,10 +18,18 @@ export interface HistoryItem {
   created_at: string;
 }
 
+export interface HistoryPage {
+  items: HistoryItem[];
+  // pass as ?cursor= to fetch the next (older) page; null on the last page
+  next_cursor: string | null;
+}
+
 export interface HistoryDetails extends HistoryItem {
   image_path: string | null;
   probabilities: Record<string, number>;
-  image_base64?: string;
+  // small preview; original_url is the full upload while it is retained
+  image_url?: string | null;
+  original_url?: string | null;
   recommendations: {
     title: string;
     items: string[];
@@ -43,15 +51,15 @@ export interface Metrics {
   roc_auc?: Record<string, number>;
   confusion_matrix?: number[][];
   classification_report?: any;
-  // Base64 images
-  confusion_matrix_base64?: string;
-  confusion_matrix_normalized_base64?: string;
-  training_curves_base64?: string;
-  roc_curves_base64?: string;
-  precision_recall_curves_base64?: string;
-  per_class_performance_base64?: string;
-  class_distribution_base64?: string;
-  performance_summary_base64?: string;
+  // Image URLs, relative to the API root
+  confusion_matrix_url?: string;
+  confusion_matrix_normalized_url?: string;
+  training_curves_url?: string;
+  roc_curves_url?: string;
+  precision_recall_curves_url?: string;
+  per_class_performance_url?: string;
+  class_distribution_url?: string;
+  performance_summary_url?: string;
 }
 
 export interface ApiError {
@@ -0,0 +1,174 @@
+"""
+tf.data input pipeline shared by model.py and generate_artifacts.py
+
+Replaces ImageDataGenerator.flow_from_directory: images are decoded in
+parallel, cached as uint8 after the first epoch, augmented per batch with
+vectorized ops and prefetched, so the training step is not starved.
+"""
+import math
+import os
+
+import numpy as np
+import tensorflow as tf
+
+IMG_SIZE = (224, 224)
+AUTOTUNE = tf.data.AUTOTUNE
+SEED = 1337
+IMAGE_EXTENSIONS = {'.png', '.jpg', '.jpeg', '.bmp', '.tif', '.tiff', '.webp'}
+
+# Same augmentation settings model.py used with ImageDataGenerator
+ROTATION_DEGREES = 30
+SHIFT_FRACTION = 0.2
+ZOOM_FRACTION = 0.2
+BRIGHTNESS_RANGE = (0.7, 1.3)
+SHEAR_DEGREES = 0.1
+CONTRAST_RANGE = (0.8, 1.2)
+
+
+def class_names_in(root):
+    # same ordering flow_from_directory uses: sorted sub-directory names
+    return sorted(d for d in os.listdir(root) if os.path.isdir(os.path.join(root, d)))
+
+
+def load_split(root, subset=None, validation_split=0.0, class_names=None):
+    """Lists (paths, labels, class_names) under root/<class>/.
+
+    With `subset` of 'training' / 'validation' the files are split per class
+    exactly like flow_from_directory(validation_split=...): the first
+    `validation_split` fraction of each class's sorted files is validation.
+    """
+    class_names = list(class_names or class_names_in(root))
+    paths, labels = [], []
+    for index, class_name in enumerate(class_names):
+        class_dir = os.path.join(root, class_name)
+        files = sorted(f for f in os.listdir(class_dir) if os.path.splitext(f)[1].lower() in IMAGE_EXTENSIONS)
+        if subset is not None:
+            n_val = int(math.floor(len(files) * validation_split))
+            files = files[:n_val] if subset == 'validation' else files[n_val:]
+        paths.extend(os.path.join(class_dir, f) for f in files)
+        labels.extend([index] * len(files))
+    return paths, np.array(labels, dtype=np.int32), class_names
+
+
+def decode_image(path):
+    """Reads one file into a (224, 224, 1) uint8 tensor"""
+    image = tf.io.decode_image(tf.io.read_file(path), channels=1, expand_animations=False)
+    # nearest, like flow_from_directory's default interpolation
+    image = tf.image.resize(image, IMG_SIZE, method='nearest')
+    return tf.cast(image, tf.uint8)
+
+
+def _shear(images, seed):
+    n = tf.shape(images)[0]
+    angle = tf.random.stateless_uniform([n], seed, -SHEAR_DEGREES, SHEAR_DEGREES) * (math.pi / 180.0)
+    cy = tf.cast(tf.shape(images)[1], tf.float32) / 2.0
+    zeros = tf.zeros([n])
+    # output -> input mapping of a horizontal shear about the image centre
+    transforms = tf.stack([
+        tf.ones([n]), -tf.sin(angle), tf.sin(angle) * cy,
+        zeros, tf.cos(angle), (1.0 - tf.cos(angle)) * cy,
+        zeros, zeros,
+    ], axis=1)
+    return tf.raw_ops.ImageProjectiveTransformV3(
+        images=images, transforms=transforms, output_shape=tf.shape(images)[1:3],
+        fill_value=0.0, interpolation='BILINEAR', fill_mode='NEAREST')
+
+
+def build_augmenter(seed=SEED):
+    """Batch-level augmentation with the former ImageDataGenerator settings, in its order:
+    geometric transforms, brightness (clipped, like PIL's ImageEnhance), then
+    the contrast `preprocessing_function`, which ImageDataGenerator ran last
+    in `standardize` and which, like tf.image.random_contrast, is not clipped.
+    """
+    # one seed per layer: equal seeds would draw identical uniforms, making
+    # rotation, shift, zoom and flip perfectly correlated per image
+    geometric = tf.keras.Sequential([
+        tf.keras.layers.RandomRotation(ROTATION_DEGREES / 360.0, fill_mode='nearest', seed=seed),
+        tf.keras.layers.RandomTranslation(SHIFT_FRACTION, SHIFT_FRACTION, fill_mode='nearest', seed=seed + 1),
+        tf.keras.layers.RandomZoom(ZOOM_FRACTION, ZOOM_FRACTION, fill_mode='nearest', seed=seed + 2),
+        tf.keras.layers.RandomFlip('horizontal', seed=seed + 3),
+    ])
+
+    def augment(images, stateless_seed):
+        n = tf.shape(images)[0]
+        seeds = tf.random.experimental.stateless_split(stateless_seed, 3)
+        images = geometric(images, training=True)
+        images = _shear(images, seeds[0])
+        brightness = tf.random.stateless_uniform([n, 1, 1, 1], seeds[1], *BRIGHTNESS_RANGE)
+        images = tf.clip_by_value(images * brightness, 0.0, 1.0)
+        # per-image contrast around the image mean (tf.image.random_contrast)
+        contrast = tf.random.stateless_uniform([n, 1, 1, 1], seeds[2], *CONTRAST_RANGE)
+        mean = tf.reduce_mean(images, axis=[1, 2, 3], keepdims=True)
+        return (images - mean) * contrast + mean
+
+    return augment
+
+
+def make_dataset(paths, labels, n_classes, batch_size=32, training=False, augment=False,
+                 cache=True, seed=SEED, drop_remainder=False):
+    """Batched (images float32 0-1, one-hot labels) dataset.
+
+    `cache` is True (in memory), False, or a file path for tf.data's on-disk
+    cache. Decoded images are cached as uint8 so the in-memory cache stays
+    a quarter of the float size.
+    """
+    ds = tf.data.Dataset.from_tensor_slices((list(paths), np.asarray(labels, dtype=np.int32)))
+    ds = ds.map(lambda p, y: (decode_image(p), y), num_parallel_calls=AUTOTUNE, deterministic=True)
+    if cache:
+        ds = ds.cache(cache if isinstance(cache, str) else '')
+    if training:
+        ds = ds.shuffle(min(len(paths), 10000), seed=seed, reshuffle_each_iteration=True)
+    ds = ds.batch(batch_size, drop_remainder=drop_remainder)
+    return _finish(ds, n_classes, augment, seed)
+
+
+def make_array_dataset(images, rows, labels, n_classes, batch_size=32, training=False, augment=False,
+                       seed=SEED, drop_remainder=False, num_shards=1, shard_index=0, class_weights=None):
+    """Same batches as make_dataset, gathered from a (N, 224, 224, 1) uint8 array.
+
+    `images` is typically the np.memmap written by dataset_cache.py and
+    `rows` the row of each example in it, so nothing is decoded; only the
+    row indices are shuffled and each batch is one gather from the map.
+
+    With `num_shards` > 1 only every num_shards-th example starting at
+    `shard_index` is read (one shard per training worker). `class_weights`
+    (one weight per class) adds a third, sample-weight element to each batch.
+    """
+    rows = np.asarray(rows, dtype=np.int64)
+    labels = np.asarray(labels, dtype=np.int32)
+
+    def gather(positions):
+        return np.ascontiguousarray(images[rows[positions]]), labels[positions]
+
+    def load(positions):
+        x, y = tf.numpy_function(gather, [positions], (tf.uint8, tf.int32))
+        x.set_shape((None,) + IMG_SIZE + (1,))
+        y.set_shape((None,))
+        return x, y
+
+    ds = tf.data.Dataset.range(len(rows))
+    if num_shards > 1:
+        ds = ds.shard(num_shards, shard_index)
+    if training:
+        ds = ds.shuffle(len(rows), seed=seed, reshuffle_each_iteration=True)
+    ds = ds.batch(batch_size, drop_remainder=drop_remainder)
+    ds = ds.map(load, num_parallel_calls=AUTOTUNE)
+    return _finish(ds, n_classes, augment, seed, class_weights)
+
+
+def _finish(ds, n_classes, augment, seed, class_weights=None):
+    def to_model_input(images, y):
+        return tf.cast(images, tf.float32) / 255.0, tf.one_hot(y, n_classes)
+    ds = ds.map(to_model_input, num_parallel_calls=AUTOTUNE)
+
+    if augment:
+        augment_fn = build_augmenter(seed)
+        seeds = tf.data.Dataset.random(seed=seed).batch(2)
+        ds = tf.data.Dataset.zip((ds, seeds)).map(
+            lambda batch, s: (augment_fn(batch[0], s), batch[1]),
+            num_parallel_calls=AUTOTUNE)
+    if class_weights is not None:
+        weights = tf.constant(class_weights, dtype=tf.float32)
+        ds = ds.map(lambda x, y: (x, y, tf.gather(weights, tf.argmax(y, axis=1))),
+                    num_parallel_calls=AUTOTUNE)
+    return ds.prefetch(AUTOTUNE)
@@ -1,66 +1,86 @@
+"""
+Trainer for the brain tumor classifier
+
+Importable (`from model import train`) and runnable as a script. Training
+runs under tf.distribute.MultiWorkerMirroredStrategy whenever TF_CONFIG
+describes more than one worker: every worker reads its own shard of the
+dataset cache, class weights are computed once from the full training set
+and applied as sample weights, and progress is backed up every epoch so an
+interrupted run resumes where it stopped.
+
+Usage:
+    python model.py                       # single process
+    python model.py --workers 2           # 2 local worker processes (testing distribution)
+    TF_CONFIG='{...}' python model.py     # one worker of a multi-node cluster
+"""
+import argparse
+import json
+import os
+import socket
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
 import tensorflow as tf
-from tensorflow.keras.callbacks import EarlyStopping, ReduceLROnPlateau
+from tensorflow.keras.callbacks import BackupAndRestore, Callback, EarlyStopping, ReduceLROnPlateau
 from tensorflow.keras.models import Model
 from tensorflow.keras.layers import Conv2D, MaxPooling2D, BatchNormalization, Dense, Dropout, GlobalAveragePooling2D, Input, Add, Activation
 from tensorflow.keras.regularizers import l2
-from tensorflow.keras.preprocessing.image import ImageDataGenerator
 import numpy as np
 from sklearn.utils.class_weight import compute_class_weight
 from sklearn.metrics import f1_score, classification_report, confusion_matrix
 
+import dataset_cache
+from dataset_cache import load_cached_split
+from input_pipeline import make_array_dataset
+
+TRAIN_DIR = "data/Training"
+TEST_DIR = "data/Testing"
+ARTIFACTS_DIR = "artifacts"
+MODEL_PATH = os.path.join(ARTIFACTS_DIR, "brain_model.h5")
+CHECKPOINT_DIR = os.path.join(ARTIFACTS_DIR, "checkpoints")
+VALIDATION_SPLIT = 0.2
+BASE_BATCH_SIZE = 32
+BASE_LEARNING_RATE = 1e-3  # Adam default, tuned at BASE_BATCH_SIZE
+
 class FocalLoss(tf.keras.losses.Loss):
     def __init__(self, gamma=2., alpha=0.25, **kwargs):
         super(FocalLoss, self).__init__(**kwargs)
         self.gamma = gamma
         self.alpha = alpha
     def call(self, y_true, y_pred):
+        # always in float32: under mixed precision 1e-7 underflows and log() overflows in 16 bit
+        y_true = tf.cast(y_true, tf.float32)
+        y_pred = tf.cast(y_pred, tf.float32)
         y_pred = tf.clip_by_value(y_pred, 1e-7, 1.0 - 1e-7)
         cross_entropy = -y_true * tf.math.log(y_pred)
         weight = self.alpha * tf.math.pow(1 - y_pred, self.gamma)
         return tf.reduce_sum(weight * cross_entropy, axis=1)
 
-train_datagen = ImageDataGenerator(
-    rescale=1./255,
-    rotation_range=30,
-    width_shift_range=0.2,
-    height_shift_range=0.2,
-    zoom_range=0.2,
-    horizontal_flip=True,
-    brightness_range=[0.7, 1.3],
-    shear_range=0.1,
-    fill_mode='nearest',
-    validation_split=0.2,
-    preprocessing_function=lambda x: tf.image.random_contrast(x, 0.8, 1.2)
-)
-
-test_datagen = ImageDataGenerator(rescale=1./255)
-
-train_generator = train_datagen.flow_from_directory(
-    "data/Training",
-    target_size=(224, 224),
-    batch_size=32,
-    color_mode="grayscale",
-    class_mode="categorical",
-    subset="training"
-)
-
-val_generator = train_datagen.flow_from_directory(
-    "data/Training",
-    target_size=(224, 224),
-    batch_size=32,
-    color_mode="grayscale",
-    class_mode="categorical",
-    subset="validation"
-)
-
-test_generator = test_datagen.flow_from_directory(
-    "data/Testing",
-    target_size=(224, 224),
-    batch_size=32,
-    color_mode="grayscale",
-    class_mode="categorical",
-    shuffle=False
-)
+
+class ThroughputCallback(Callback):
+    """Prints and logs training images/second for every epoch"""
+
+    def __init__(self, n_images):
+        super().__init__()
+        self.n_images = n_images
+        self.images_per_second = []
+
+    def on_epoch_begin(self, epoch, logs=None):
+        self._started = time.perf_counter()
+
+    def on_train_batch_end(self, batch, logs=None):
+        # end of the training part of the epoch, before validation starts
+        self._train_seconds = time.perf_counter() - self._started
+
+    def on_epoch_end(self, epoch, logs=None):
+        rate = self.n_images / self._train_seconds
+        self.images_per_second.append(rate)
+        if logs is not None:
+            logs["images_per_second"] = rate
+        print(f"Epoch {epoch + 1}: {rate:.1f} images/s ({self._train_seconds:.1f}s)")
 
 def residual_block(x, filters, kernel_size=3, reg=5e-4):
     shortcut = x
@@ -74,7 +94,7 @@ def residual_block(x, filters, kernel_size=3, reg=5e-4):
     out = Activation("relu")(out)
     return out
 
-def build_model():
+def build_model(num_classes):
     inputs = Input(shape=(224,224,1))
     x = Conv2D(32, 3, padding='same', activation='relu', kernel_regularizer=l2(5e-4))(inputs)
     x = BatchNormalization()(x)
@@ -109,48 +129,254 @@ def build_model():
     x = GlobalAveragePooling2D()(x)
     x = Dense(128, activation='relu', kernel_regularizer=l2(5e-4))(x)
     x = Dropout(0.5)(x)
-    outputs = Dense(train_generator.num_classes, activation='softmax')(x)
+    # softmax kept in float32 under mixed precision
+    outputs = Dense(num_classes, activation='softmax', dtype='float32')(x)
     return Model(inputs, outputs)
 
-model = build_model()
-model.compile(optimizer='adam', loss=FocalLoss(), metrics=['accuracy'])
 
-early_stop = EarlyStopping(patience=5, restore_best_weights=True)
-reduce_lr = ReduceLROnPlateau(monitor='val_loss', factor=0.5, patience=2, min_lr=1e-6, verbose=1)
+def worker_info():
+    """(num_workers, task_index, is_chief) from TF_CONFIG; (1, 0, True) without it"""
+    tf_config = json.loads(os.environ.get("TF_CONFIG") or "{}")
+    cluster = tf_config.get("cluster", {})
+    task = tf_config.get("task", {})
+    num_workers = len(cluster.get("worker", [])) + len(cluster.get("chief", []))
+    if num_workers <= 1:
+        return 1, 0, True
+    task_type, task_index = task.get("type", "worker"), int(task.get("index", 0))
+    is_chief = task_type == "chief" or (task_type == "worker" and task_index == 0 and "chief" not in cluster)
+    return num_workers, task_index, is_chief
+
+
+def make_strategy():
+    if worker_info()[0] > 1:
+        # ring all-reduce over gRPC; the CPU-friendly collective implementation
+        options = tf.distribute.experimental.CommunicationOptions(
+            implementation=tf.distribute.experimental.CommunicationImplementation.RING)
+        return tf.distribute.MultiWorkerMirroredStrategy(communication_options=options)
+    return tf.distribute.get_strategy()
+
+
+def balanced_class_weights(labels, num_classes):
+    """Per-class 'balanced' weights from the labels of the whole training set"""
+    classes = np.unique(labels)
+    weights = np.ones(num_classes, dtype=np.float32)
+    weights[classes] = compute_class_weight('balanced', classes=classes, y=labels)
+    return weights
+
+
+def _distributed_dataset(strategy, images, rows, labels, num_classes, global_batch_size, **kwargs):
+    def dataset_fn(input_context):
+        ds = make_array_dataset(
+            images, rows, labels, num_classes,
+            input_context.get_per_replica_batch_size(global_batch_size),
+            drop_remainder=True,
+            num_shards=input_context.num_input_pipelines,
+            shard_index=input_context.input_pipeline_id,
+            **kwargs)
+        # workers must run the same number of steps: repeat and bound by steps
+        return ds.repeat()
+    return strategy.distribute_datasets_from_function(dataset_fn)
+
+
+def train(batch_size=BASE_BATCH_SIZE, epochs=30, learning_rate=None, mixed_precision="off", xla=False,
+          checkpoint_dir=CHECKPOINT_DIR, output_path=MODEL_PATH, evaluate=True):
+    """Trains the model; returns (model, history).
+
+    `batch_size` is the global batch size, split over all replicas; the
+    learning rate scales linearly with it unless given. Every worker takes
+    part in saving, but only the chief's copy is kept, and only the chief
+    evaluates on the test set.
+    """
+    num_workers, task_index, is_chief = worker_info()
+    strategy = make_strategy()
+    if mixed_precision != "off":
+        tf.keras.mixed_precision.set_global_policy(f"mixed_{mixed_precision}")
+    learning_rate = learning_rate or BASE_LEARNING_RATE * batch_size / BASE_BATCH_SIZE
+    print(f"Workers {num_workers} (task {task_index}{', chief' if is_chief else ''}), "
+          f"replicas {strategy.num_replicas_in_sync}, batch size {batch_size}, learning rate {learning_rate:g}, "
+          f"precision {tf.keras.mixed_precision.global_policy().name}, XLA {'on' if xla else 'off'}")
+
+    # Images are read from the preprocessed memmap cache (dataset_cache.py);
+    # with several workers it must already be built (see launch_local_workers).
+    # Same 80/20 per-class split and augmentation as the former ImageDataGenerator setup
+    update_cache = num_workers == 1
+    train_images, train_rows, train_labels, class_names = load_cached_split(
+        TRAIN_DIR, subset="training", validation_split=VALIDATION_SPLIT, update=update_cache)
+    val_images, val_rows, val_labels, _ = load_cached_split(
+        TRAIN_DIR, subset="validation", validation_split=VALIDATION_SPLIT, class_names=class_names,
+        update=update_cache)
+    num_classes = len(class_names)
+    print(f"Found {len(train_rows)} training and {len(val_rows)} validation images "
+          f"belonging to {num_classes} classes.")
+
+    # computed over the full training set, not per shard, so every worker weights alike
+    class_weights = balanced_class_weights(train_labels, num_classes)
+
+    if num_workers > 1:
+        train_ds = _distributed_dataset(strategy, train_images, train_rows, train_labels, num_classes, batch_size,
+                                        training=True, augment=True, class_weights=class_weights)
+        val_ds = _distributed_dataset(strategy, val_images, val_rows, val_labels, num_classes, batch_size)
+        steps_per_epoch = max(1, len(train_rows) // batch_size)
+        validation_steps = max(1, len(val_rows) // batch_size)
+        images_per_epoch = steps_per_epoch * batch_size
+    else:
+        train_ds = make_array_dataset(train_images, train_rows, train_labels, num_classes, batch_size,
+                                      training=True, augment=True, class_weights=class_weights)
+        val_ds = make_array_dataset(val_images, val_rows, val_labels, num_classes, batch_size)
+        steps_per_epoch = validation_steps = None
+        images_per_epoch = len(train_rows)
+
+    with strategy.scope():
+        model = build_model(num_classes)
+        model.compile(optimizer=tf.keras.optimizers.Adam(learning_rate), loss=FocalLoss(), metrics=['accuracy'],
+                      jit_compile=xla)
+
+    # each non-chief worker backs up to its own directory so workers never write the same file
+    backup_dir = checkpoint_dir if is_chief else os.path.join(checkpoint_dir, f"worker-{task_index}")
+    throughput = ThroughputCallback(images_per_epoch)
+    callbacks = [
+        BackupAndRestore(backup_dir),
+        throughput,
+        EarlyStopping(patience=5, restore_best_weights=True),
+        ReduceLROnPlateau(monitor='val_loss', factor=0.5, patience=2, min_lr=1e-6, verbose=1),
+    ]
+
+    history = model.fit(
+        train_ds,
+        validation_data=val_ds,
+        epochs=epochs,
+        steps_per_epoch=steps_per_epoch,
+        validation_steps=validation_steps,
+        callbacks=callbacks,
+        verbose=1 if is_chief else 2
+    )
+    if throughput.images_per_second:
+        rates = throughput.images_per_second[1:] or throughput.images_per_second
+        print(f"Mean training throughput: {sum(rates) / len(rates):.1f} images/s (first epoch excluded: tracing)")
+
+    # Saving and reading variables under MultiWorkerMirroredStrategy can run
+    # collectives, so every worker takes part: non-chief workers save to a
+    # throwaway directory. Evaluation then only uses the fetched weights.
+    weights = model.get_weights()
+    export_model = model
+    if mixed_precision != "off":
+        # the saved model is for serving: rebuilt with float32 layers so the
+        # file carries no mixed policies (variables are float32 either way)
+        tf.keras.mixed_precision.set_global_policy("float32")
+        export_model = build_model(num_classes)
+        export_model.set_weights(weights)
+        export_model.compile(loss=FocalLoss(), metrics=['accuracy'])
+    save_path = output_path if is_chief else os.path.join(
+        tempfile.mkdtemp(prefix=f"worker-{task_index}-"), os.path.basename(output_path))
+    os.makedirs(os.path.dirname(save_path) or ".", exist_ok=True)
+    export_model.save(save_path)
+    if not is_chief:
+        shutil.rmtree(os.path.dirname(save_path), ignore_errors=True)
+        return model, history
+
+    with open(os.path.join(os.path.dirname(output_path) or ".", "class_indices.json"), "w") as f:
+        json.dump({name: i for i, name in enumerate(class_names)}, f)
+    print(f"✅ Saved model to {output_path}")
+    if evaluate:
+        evaluate_model(weights, class_names, batch_size, update_cache)
+    return model, history
+
+
+def evaluate_model(weights, class_names, batch_size=BASE_BATCH_SIZE, update_cache=True):
+    """Test-set loss, accuracy, F1, classification report and confusion matrix for
+    a model with the given weights (`model.get_weights()`)"""
+    num_classes = len(class_names)
+    test_images, test_rows, test_labels, _ = load_cached_split(TEST_DIR, class_names=class_names, update=update_cache)
+    test_ds = make_array_dataset(test_images, test_rows, test_labels, num_classes, batch_size)
+
+    # a local copy outside the distribution strategy, so only this worker runs it
+    local_model = build_model(num_classes)
+    local_model.set_weights(weights)
+    local_model.compile(loss=FocalLoss(), metrics=['accuracy'])
+
+    loss_test, accuracy_test = local_model.evaluate(test_ds, verbose=0)
+    print("Test loss:", loss_test)
+    print("Test accuracy:", accuracy_test)
+
+    x_sample, y_sample = next(iter(test_ds.skip(1)))
+    prediction = local_model.predict(x_sample[:1])
+    prediction_class = np.argmax(prediction, axis=1)[0]
+    true_class = np.argmax(y_sample[:1], axis=1)[0]
+
+    print("Predicted class:", prediction_class)
+    print("True class:", true_class)
+    print("Prediction probabilities:", prediction)
+
+
+    y_pred = local_model.predict(test_ds)
+    y_pred_classes = np.argmax(y_pred, axis=1)
+    y_true = test_labels
+
+    f1 = f1_score(y_true, y_pred_classes, average='weighted')
+    print("F1 Score:", f1)
+    print("Classification Report:\n", classification_report(y_true, y_pred_classes))
+    print("Confusion Matrix:\n", confusion_matrix(y_true, y_pred_classes))
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("localhost", 0))
+        return s.getsockname()[1]
 
-classes = np.unique(train_generator.classes)
-class_weights = compute_class_weight('balanced', classes=classes, y=train_generator.classes)
-class_weights = dict(zip(classes, class_weights))
 
-model.fit(
-    train_generator,
-    validation_data=val_generator,
-    epochs=30,
-    callbacks=[early_stop, reduce_lr],
-    class_weight=class_weights,
-    verbose=1
-)
+def launch_local_workers(n_workers, argv):
+    """Runs this script as n_workers processes on this host, one TF_CONFIG each.
 
+    The dataset cache is brought up to date first, so the workers only read
+    it. Returns the highest worker exit code.
+    """
+    for split in (TRAIN_DIR, TEST_DIR):
+        dataset_cache.build_cache(split)
+    workers = [f"localhost:{_free_port()}" for _ in range(n_workers)]
+    processes = []
+    for index in range(n_workers):
+        env = dict(os.environ)
+        env["TF_CONFIG"] = json.dumps({"cluster": {"worker": workers}, "task": {"type": "worker", "index": index}})
+        # the workers share this host's cores
+        env.setdefault("TF_NUM_INTRAOP_THREADS", str(max(1, (os.cpu_count() or 1) // n_workers)))
+        processes.append(subprocess.Popen([sys.executable, os.path.abspath(__file__)] + argv, env=env))
+    try:
+        return max(p.wait() for p in processes)
+    except KeyboardInterrupt:
+        for p in processes:
+            p.terminate()
+        raise
 
-loss_test, accuracy_test = model.evaluate(test_generator, verbose=0)
-print("Test loss:", loss_test)
-print("Test accuracy:", accuracy_test)
 
-x_sample, y_sample = test_generator[1] 
-prediction = model.predict(x_sample[:1])
-prediction_class = np.argmax(prediction, axis=1)[0]
-true_class = np.argmax(y_sample[:1], axis=1)[0]
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Train the brain tumor classifier")
+    parser.add_argument("--batch-size", type=int, default=BASE_BATCH_SIZE,
+                        help="Global batch size; the learning rate is scaled linearly from %(default)s")
+    parser.add_argument("--learning-rate", type=float, default=None,
+                        help="Override the scaled learning rate")
+    parser.add_argument("--epochs", type=int, default=30)
+    parser.add_argument("--mixed-precision", choices=["off", "bfloat16", "float16"], default="off",
+                        help="bfloat16 is the one that speeds up CPUs with AVX512-BF16/AMX; float16 targets GPUs")
+    parser.add_argument("--xla", action="store_true", help="Compile the train step with XLA (jit_compile=True)")
+    parser.add_argument("--checkpoint-dir", default=CHECKPOINT_DIR,
+                        help="Per-epoch backup; an interrupted run resumes from it")
+    parser.add_argument("--output", default=MODEL_PATH)
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Launch this many local worker processes (MultiWorkerMirroredStrategy)")
+    return parser.parse_args(argv)
 
-print("Predicted class:", prediction_class)
-print("True class:", true_class)
-print("Prediction probabilities:", prediction)
 
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    args = parse_args(argv)
+    if args.workers > 1 and "TF_CONFIG" not in os.environ:
+        worker_argv = [a for i, a in enumerate(argv)
+                       if not a.startswith("--workers") and (i == 0 or argv[i - 1] != "--workers")]
+        sys.exit(launch_local_workers(args.workers, worker_argv))
+    train(batch_size=args.batch_size, epochs=args.epochs, learning_rate=args.learning_rate,
+          mixed_precision=args.mixed_precision, xla=args.xla, checkpoint_dir=args.checkpoint_dir,
+          output_path=args.output)
 
-y_pred = model.predict(test_generator)
-y_pred_classes = np.argmax(y_pred, axis=1)
-y_true = test_generator.classes
 
-f1 = f1_score(y_true, y_pred_classes, average='weighted')
-print("F1 Score:", f1)
-print("Classification Report:\n", classification_report(y_true, y_pred_classes))
-print("Confusion Matrix:\n", confusion_matrix(y_true, y_pred_classes))
\ No newline at end of file
+if __name__ == "__main__":
+    main()